@@ -1,226 +1,607 @@
 """
 Analytics data collector and processor.
 """
-import json
+import asyncio
+import calendar
+import contextlib
+import heapq
+import logging
+import queue
+import sqlite3
+import threading
 import time
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-import aiosqlite
+from operator import itemgetter
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+import orjson
 from models import Metric, UserStats, SystemMetrics, DailyReport, MetricRecord
-from config import ANALYTICS_DB_PATH
-from sqlalchemy.orm import Session
+from config import ANALYTICS_DB_PATH, settings
+from database import get_redis
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Applied to every connection when it is opened
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Read connections kept open alongside the single writer (WAL allows concurrent readers)
+READ_POOL_SIZE = 4
+
+CREATE_METRICS_SQL = """
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        value REAL NOT NULL,
+        user_id TEXT NOT NULL,
+        meta_data TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+CREATE_HOURLY_SQL = """
+    CREATE TABLE IF NOT EXISTS metrics_hourly (
+        hour_bucket INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        cnt INTEGER NOT NULL,
+        total REAL NOT NULL,
+        PRIMARY KEY (hour_bucket, user_id, type)
+    ) WITHOUT ROWID
+"""
+
+BACKFILL_HOURLY_SQL = """
+    INSERT INTO metrics_hourly (hour_bucket, user_id, type, cnt, total)
+    SELECT CAST(strftime('%s', timestamp) AS INTEGER) / 3600, user_id, type, COUNT(*), SUM(value)
+    FROM metrics
+    GROUP BY 1, 2, 3
+"""
+
+USER_STATS_SQL = """
+    SELECT
+        type,
+        COUNT(*) as count,
+        SUM(value) as total_value,
+        AVG(value) as avg_value
+    FROM metrics
+    WHERE user_id = ? AND timestamp >= ? AND timestamp <= ?
+    GROUP BY type
+"""
+
+SYSTEM_METRICS_SQL = """
+    WITH recent AS (
+        SELECT hour_bucket, user_id, type, cnt, total
+        FROM metrics_hourly
+        WHERE hour_bucket > ?
+    ),
+    per_user AS (
+        SELECT
+            user_id,
+            SUM(CASE WHEN type = 'cost' THEN total ELSE 0 END) AS total_cost,
+            SUM(CASE WHEN type = 'api_call' THEN cnt ELSE 0 END) AS api_calls
+        FROM recent
+        GROUP BY user_id
+    )
+    SELECT
+        (SELECT COALESCE(SUM(cnt), 0) FROM metrics_hourly),
+        (SELECT COUNT(*) FROM per_user),
+        (SELECT AVG(total_cost) FROM per_user),
+        (SELECT AVG(api_calls) FROM per_user),
+        (SELECT hour_bucket % 24 AS hour FROM recent GROUP BY hour ORDER BY SUM(cnt) DESC LIMIT 1)
+"""
+
+DAILY_USER_COUNT_SQL = "SELECT COUNT(DISTINCT user_id) FROM metrics_hourly WHERE hour_bucket BETWEEN ? AND ?"
+
+DAILY_TYPE_TOTALS_SQL = """
+    SELECT
+        type,
+        SUM(cnt) as count,
+        SUM(total) as total_value
+    FROM metrics_hourly
+    WHERE hour_bucket BETWEEN ? AND ?
+    GROUP BY type
+"""
+
+DAILY_USER_TOTALS_SQL = """
+    SELECT user_id, SUM(cnt) as activity_count, SUM(total) as total_value
+    FROM metrics_hourly
+    WHERE hour_bucket BETWEEN ? AND ?
+    GROUP BY user_id
+"""
+
+# Users listed in the daily report
+TOP_USERS_LIMIT = 10
+
+INSERT_METRIC_SQL = "INSERT INTO metrics (type, value, user_id, meta_data, timestamp) VALUES (?, ?, ?, ?, ?)"
+
+UPSERT_HOURLY_SQL = """
+    INSERT INTO metrics_hourly (hour_bucket, user_id, type, cnt, total) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (hour_bucket, user_id, type) DO UPDATE SET
+        cnt = cnt + excluded.cnt,
+        total = total + excluded.total
+"""
+
+# How long the writer waits for more metrics before committing a partial batch
+FLUSH_INTERVAL_SECONDS = 0.1
+
+# Final flushes close() attempts before raising with the unwritten metrics still buffered
+CLOSE_FLUSH_ATTEMPTS = 3
+
+# Redis cache for aggregate reads, invalidated by writes
+CACHE_KEY_PREFIX = "analytics:"
+SYSTEM_METRICS_CACHE_TTL = 60
+DAILY_REPORT_CACHE_TTL = 86400
+TODAY_REPORT_CACHE_TTL = 60
+
+def _hour_bucket(ts: datetime) -> int:
+    """Hours since the Unix epoch for a naive UTC timestamp."""
+    return calendar.timegm(ts.utctimetuple()) // 3600
+
+def _day_buckets(day: datetime) -> Tuple[int, int]:
+    """First and last hour bucket of a UTC day.
+    
+    Together they bound a prefix range of the metrics_hourly primary key, so a
+    day lookup is one index seek plus a sequential read of that day's rows.
+    """
+    start = _hour_bucket(datetime(day.year, day.month, day.day))
+    return start, start + 23
+
+def _system_metrics_key() -> str:
+    """Cache key for the current minute's system metrics."""
+    return f"{CACHE_KEY_PREFIX}sys_metrics:{int(time.time() // 60)}"
+
+def _daily_report_key(date: str) -> str:
+    return f"{CACHE_KEY_PREFIX}daily:{date}"
+
+async def _cache_get(key: str) -> Optional[str]:
+    """Read a cached value, treating Redis errors as a miss."""
+    redis = await get_redis()
+    if not redis:
+        return None
+    try:
+        return await redis.get(key)
+    except Exception as e:
+        logger.warning(f"Failed to read {key} from Redis: {str(e)}")
+        return None
+
+async def _cache_set(key: str, value: str, ttl: int):
+    redis = await get_redis()
+    if not redis:
+        return
+    try:
+        await redis.setex(key, ttl, value)
+    except Exception as e:
+        logger.warning(f"Failed to cache {key} in Redis: {str(e)}")
+
+async def _invalidate_cache(keys: Iterable[str] = (), match: Optional[str] = None):
+    """Delete cached keys, plus any matching a SCAN pattern."""
+    redis = await get_redis()
+    if not redis:
+        return
+    try:
+        keys = list(keys)
+        if match:
+            keys.extend([key async for key in redis.scan_iter(match=match)])
+        if keys:
+            await redis.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate analytics cache: {str(e)}")
 
 class AnalyticsCollector:
     """Analytics data collector for metrics processing."""
     
     def __init__(self, db_path: str = ANALYTICS_DB_PATH):
         self.db_path = db_path
+        # SQLite work runs on worker threads: one locked writer plus a pool of idle readers
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._readers: queue.SimpleQueue = queue.SimpleQueue()
+        # Pending metrics buffered column-wise until the writer task flushes them
+        self._buffer_lock = threading.Lock()
+        self._types: List[str] = []
+        self._values: List[float] = []
+        self._user_ids: List[str] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._timestamps: List[datetime] = []
+        self._flush_event: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._writer_task: Optional[asyncio.Task] = None
+        self._purge_task: Optional[asyncio.Task] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection usable from any worker thread."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    async def _write(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(writer, *args) on a worker thread while holding the write lock."""
+        return await asyncio.to_thread(self._call_writer, fn, *args)
+    
+    def _call_writer(self, fn: Callable[..., Any], *args) -> Any:
+        if self._writer is None:
+            raise RuntimeError("Analytics database not initialized")
+        with self._write_lock:
+            return fn(self._writer, *args)
+    
+    async def _read(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(reader, *args) on a worker thread with a pooled read connection."""
+        return await asyncio.to_thread(self._call_reader, fn, *args)
+    
+    def _call_reader(self, fn: Callable[..., Any], *args) -> Any:
+        if self._writer is None:
+            raise RuntimeError("Analytics database not initialized")
+        conn = self._readers.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._readers.put(conn)
     
     async def init_db(self):
-        """Initialize analytics database."""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT NOT NULL,
-                    value REAL NOT NULL,
-                    user_id TEXT NOT NULL,
-                    meta_data TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_type ON metrics(type)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_user ON metrics(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)")
-            await db.commit()
+        """Open connections and initialize analytics database."""
+        if self._writer is None:
+            self._writer = await asyncio.to_thread(self._connect)
+            for _ in range(READ_POOL_SIZE):
+                self._readers.put(await asyncio.to_thread(self._connect))
+        
+        await self._write(self._create_schema)
+        
+        if self._writer_task is None:
+            self._flush_event = asyncio.Event()
+            self._stopping = False
+            self._writer_task = asyncio.create_task(self._write_loop())
+        
+        if self._purge_task is None and settings.ANALYTICS_PURGE_INTERVAL > 0:
+            self._purge_task = asyncio.create_task(self._purge_loop())
+    
+    def _create_schema(self, db: sqlite3.Connection):
+        db.execute(CREATE_METRICS_SQL)
+        # Covering index for get_user_stats: user/time range seek, GROUP BY type, SUM/AVG(value)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_user_ts_type ON metrics(user_id, timestamp, type, value)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)")
+        # Superseded by idx_metrics_user_ts_type; other aggregates are served from metrics_hourly
+        db.execute("DROP INDEX IF EXISTS idx_metrics_type")
+        db.execute("DROP INDEX IF EXISTS idx_metrics_user")
+        db.execute("DROP INDEX IF EXISTS idx_metrics_ts_type_user")
+        
+        # Hourly rollup maintained by the batch writer, clustered on its key so
+        # hour_bucket range scans read contiguous pages
+        rollup_exists = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics_hourly'"
+        ).fetchone() is not None
+        db.execute(CREATE_HOURLY_SQL)
+        if not rollup_exists:
+            # Backfill from metrics recorded before the rollup existed
+            db.execute(BACKFILL_HOURLY_SQL)
+        db.commit()
+    
+    async def close(self):
+        """Flush buffered metrics and close all connections.
+        
+        Raises the last write error if metrics are still buffered after
+        CLOSE_FLUSH_ATTEMPTS flushes; the connections are closed either way.
+        """
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._purge_task
+            self._purge_task = None
+        
+        if self._writer_task is not None:
+            self._stopping = True
+            self._flush_event.set()
+            await self._writer_task
+            self._writer_task = None
+        
+        try:
+            for attempt in range(1, CLOSE_FLUSH_ATTEMPTS + 1):
+                if not self._types:
+                    break
+                try:
+                    await self.flush()
+                except Exception:
+                    if attempt == CLOSE_FLUSH_ATTEMPTS:
+                        raise
+                    await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        finally:
+            if self._writer is not None:
+                while not self._readers.empty():
+                    self._readers.get().close()
+                self._writer.close()
+                self._writer = None
     
     async def record_metric(self, metric: Metric):
-        """Record a single metric."""
-        async with aiosqlite.connect(self.db_path) as db:
-            metadata_json = json.dumps(metric.metadata) if metric.metadata else None
-            await db.execute(
-                "INSERT INTO metrics (type, value, user_id, meta_data, timestamp) VALUES (?, ?, ?, ?, ?)",
-                (metric.type.value, metric.value, metric.user_id, metadata_json, metric.timestamp)
-            )
-            await db.commit()
-    
-    async def record_metric_sync(self, db_session: Session, metric: Metric):
-        """Record metric using SQLAlchemy session (for unified DB)."""
-        metadata_json = json.dumps(metric.metadata) if metric.metadata else None
+        """Buffer a metric for the next batched insert."""
+        with self._buffer_lock:
+            self._types.append(metric.type.value)
+            self._values.append(metric.value)
+            self._user_ids.append(metric.user_id)
+            self._metadatas.append(metric.metadata)
+            self._timestamps.append(metric.timestamp)
+            full = len(self._types) >= settings.METRICS_BATCH_SIZE
+        
+        if full and self._flush_event is not None:
+            self._flush_event.set()
+    
+    def _take_buffer(self) -> tuple:
+        """Swap out the buffered columns, leaving empty ones for new metrics."""
+        with self._buffer_lock:
+            columns = (self._types, self._values, self._user_ids, self._metadatas, self._timestamps)
+            self._types, self._values, self._user_ids, self._metadatas, self._timestamps = [], [], [], [], []
+        return columns
+    
+    def _requeue(self, columns: tuple):
+        """Put unwritten columns back ahead of metrics buffered since they were taken."""
+        with self._buffer_lock:
+            self._types[:0] = columns[0]
+            self._values[:0] = columns[1]
+            self._user_ids[:0] = columns[2]
+            self._metadatas[:0] = columns[3]
+            self._timestamps[:0] = columns[4]
+    
+    async def flush(self):
+        """Write all buffered metrics now.
+        
+        Batches that fail to insert are requeued and the error is raised, so
+        the writer loop retries them on its next tick instead of dropping them.
+        """
+        columns = self._take_buffer()
+        written = 0
+        try:
+            # Commit up to METRICS_BATCH_SIZE metrics per transaction
+            size = settings.METRICS_BATCH_SIZE
+            for start in range(0, len(columns[0]), size):
+                await self._write(self._write_batch, *(column[start:start + size] for column in columns))
+                written = min(start + size, len(columns[0]))
+        except Exception:
+            self._requeue(tuple(column[written:] for column in columns))
+            raise
+        finally:
+            if written:
+                # Drop cached aggregates covering the periods just written
+                dates = {ts.strftime("%Y-%m-%d") for ts in columns[4][:written]}
+                await _invalidate_cache([_system_metrics_key(), *map(_daily_report_key, dates)])
+    
+    async def _write_loop(self):
+        """Flush the buffer every FLUSH_INTERVAL_SECONDS, or as soon as a batch fills up."""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            stopping = self._stopping
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                pending = len(self._types)
+                logger.error(f"Failed to write metrics, {pending} kept buffered for retry: {str(e)}")
+            
+            if stopping:
+                break
+    
+    def _write_batch(
+        self,
+        db: sqlite3.Connection,
+        types: List[str],
+        values: List[float],
+        user_ids: List[str],
+        metadatas: List[Optional[Dict[str, Any]]],
+        timestamps: List[datetime],
+    ):
+        """Insert a batch of metrics in a single transaction, rolling back and re-raising on failure."""
+        metadatas = [orjson.dumps(metadata).decode() if metadata else None for metadata in metadatas]
+        rows = list(zip(types, values, user_ids, metadatas, timestamps))
+        
+        counts: Counter = Counter()
+        totals: Dict[tuple, float] = defaultdict(float)
+        for metric_type, value, user_id, timestamp in zip(types, values, user_ids, timestamps):
+            key = (_hour_bucket(timestamp), user_id, metric_type)
+            counts[key] += 1
+            totals[key] += value
+        
+        try:
+            db.executemany(INSERT_METRIC_SQL, rows)
+            db.executemany(UPSERT_HOURLY_SQL, [(*key, cnt, totals[key]) for key, cnt in counts.items()])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    
+    async def record_metric_sync(self, db_session: AsyncSession, metric: Metric):
+        """Record one metric using SQLAlchemy session (for unified DB).
+        
+        For more than one metric use record_metrics_bulk_sync, which avoids a
+        unit-of-work flush and commit per row.
+        """
         db_metric = MetricRecord(
-            type=metric.type.value,
+            type=metric.type,
             value=metric.value,
             user_id=metric.user_id,
-            meta_data=metadata_json,
+            meta_data=metric.metadata or None,
             timestamp=metric.timestamp
         )
         db_session.add(db_metric)
-        db_session.commit()
+        await db_session.commit()
+    
+    async def record_metrics_bulk_sync(self, db_session: AsyncSession, metrics: List[Metric]):
+        """Record many metrics with one executemany INSERT and a single commit."""
+        if not metrics:
+            return
+        
+        rows = [
+            {
+                "type": metric.type,
+                "value": metric.value,
+                "user_id": metric.user_id,
+                "meta_data": metric.metadata or None,
+                "timestamp": metric.timestamp
+            }
+            for metric in metrics
+        ]
+        await db_session.execute(insert(MetricRecord), rows)
+        await db_session.commit()
     
     async def get_user_stats(self, user_id: str, days: int = 7) -> UserStats:
         """Get user statistics for specified period."""
+        return await self._read(self._get_user_stats, user_id, days)
+    
+    def _get_user_stats(self, db: sqlite3.Connection, user_id: str, days: int) -> UserStats:
         start_date = datetime.utcnow() - timedelta(days=days)
         end_date = datetime.utcnow()
         
-        async with aiosqlite.connect(self.db_path) as db:
-            # Get aggregated stats
-            cursor = await db.execute("""
-                SELECT 
-                    type,
-                    COUNT(*) as count,
-                    SUM(value) as total_value,
-                    AVG(value) as avg_value
-                FROM metrics 
-                WHERE user_id = ? AND timestamp >= ? AND timestamp <= ?
-                GROUP BY type
-            """, (user_id, start_date, end_date))
-            
-            results = await cursor.fetchall()
-            
-            # Initialize stats
-            stats = {
-                "api_call": {"count": 0, "total": 0.0},
-                "tool_execution": {"count": 0, "total": 0.0},
-                "cost": {"count": 0, "total": 0.0},
-                "session": {"count": 0, "total": 0.0}
-            }
-            
-            # Process results
-            for row in results:
-                metric_type, count, total_value, avg_value = row
-                if metric_type in stats:
-                    stats[metric_type] = {"count": count, "total": total_value or 0.0}
-            
-            # Calculate session duration if sessions exist
-            avg_session_duration = None
-            if stats["session"]["count"] > 0:
-                avg_session_duration = stats["session"]["total"] / stats["session"]["count"]
-            
-            return UserStats(
-                user_id=user_id,
-                days=days,
-                api_calls=stats["api_call"]["count"],
-                tool_executions=stats["tool_execution"]["count"],
-                total_cost=stats["cost"]["total"],
-                sessions=stats["session"]["count"],
-                avg_session_duration=avg_session_duration,
-                period_start=start_date,
-                period_end=end_date
-            )
+        # Get aggregated stats
+        cursor = db.execute(USER_STATS_SQL, (user_id, start_date, end_date))
+        
+        # One (count, total, avg) row per metric type
+        stats = {row[0]: row[1:] for row in cursor.fetchall()}
+        empty = (0, 0.0, None)
+        api_calls = stats.get("api_call", empty)
+        tool_executions = stats.get("tool_execution", empty)
+        cost = stats.get("cost", empty)
+        sessions = stats.get("session", empty)
+        
+        return UserStats(
+            user_id=user_id,
+            days=days,
+            api_calls=api_calls[0],
+            tool_executions=tool_executions[0],
+            total_cost=cost[1] or 0.0,
+            sessions=sessions[0],
+            avg_session_duration=sessions[2],
+            period_start=start_date,
+            period_end=end_date
+        )
     
     async def get_system_metrics(self) -> SystemMetrics:
-        """Get system-wide metrics."""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Total metrics count
-            cursor = await db.execute("SELECT COUNT(*) FROM metrics")
-            total_metrics = (await cursor.fetchone())[0]
-            
-            # Active users (users with metrics in last 24 hours)
-            yesterday = datetime.utcnow() - timedelta(days=1)
-            cursor = await db.execute(
-                "SELECT COUNT(DISTINCT user_id) FROM metrics WHERE timestamp >= ?",
-                (yesterday,)
-            )
-            active_users = (await cursor.fetchone())[0]
-            
-            # Cost per user (total cost / active users)
-            cursor = await db.execute(
-                "SELECT AVG(total_cost), AVG(api_calls) FROM ("
-                "SELECT user_id, SUM(CASE WHEN type='cost' THEN value ELSE 0 END) as total_cost, "
-                "COUNT(CASE WHEN type='api_call' THEN 1 END) as api_calls "
-                "FROM metrics WHERE timestamp >= ? GROUP BY user_id)",
-                (yesterday,)
-            )
-            result = await cursor.fetchone()
-            cost_per_user = result[0] if result[0] else 0.0
-            avg_api_calls = result[1] if result[1] else 0.0
-            
-            # Peak usage hour
-            cursor = await db.execute("""
-                SELECT strftime('%H', timestamp) as hour, COUNT(*) as count
-                FROM metrics 
-                WHERE timestamp >= ?
-                GROUP BY hour 
-                ORDER BY count DESC 
-                LIMIT 1
-            """, (yesterday,))
-            peak_result = await cursor.fetchone()
-            peak_usage_hour = int(peak_result[0]) if peak_result else None
-            
-            return SystemMetrics(
-                total_metrics=total_metrics,
-                active_users=active_users,
-                cost_per_user=cost_per_user,
-                avg_api_calls_per_user=avg_api_calls,
-                peak_usage_hour=peak_usage_hour
-            )
+        """Get system-wide metrics from the hourly rollup (last 24 hour buckets)."""
+        key = _system_metrics_key()
+        cached = await _cache_get(key)
+        if cached:
+            return SystemMetrics.model_validate_json(cached)
+        
+        metrics = await self._read(self._get_system_metrics)
+        await _cache_set(key, metrics.model_dump_json(), SYSTEM_METRICS_CACHE_TTL)
+        return metrics
+    
+    def _get_system_metrics(self, db: sqlite3.Connection) -> SystemMetrics:
+        # Active users, per-user averages and peak hour over the last 24 hours in one pass
+        since_bucket = _hour_bucket(datetime.utcnow() - timedelta(days=1))
+        cursor = db.execute(SYSTEM_METRICS_SQL, (since_bucket,))
+        total_metrics, active_users, cost_per_user, avg_api_calls, peak_hour = cursor.fetchone()
+        
+        return SystemMetrics(
+            total_metrics=total_metrics,
+            active_users=active_users,
+            cost_per_user=cost_per_user or 0.0,
+            avg_api_calls_per_user=avg_api_calls or 0.0,
+            peak_usage_hour=peak_hour
+        )
     
     async def delete_user_metrics(self, user_id: str) -> int:
         """Delete all metrics for a specific user."""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("DELETE FROM metrics WHERE user_id = ?", (user_id,))
-            await db.commit()
-            return cursor.rowcount
+        deleted = await self._write(self._delete_user_metrics, user_id)
+        await _invalidate_cache(match=f"{CACHE_KEY_PREFIX}*")
+        return deleted
+    
+    def _delete_user_metrics(self, db: sqlite3.Connection, user_id: str) -> int:
+        cursor = db.execute("DELETE FROM metrics WHERE user_id = ?", (user_id,))
+        db.execute("DELETE FROM metrics_hourly WHERE user_id = ?", (user_id,))
+        db.commit()
+        return cursor.rowcount
+    
+    async def _purge_loop(self):
+        """Purge expired metrics now and then every ANALYTICS_PURGE_INTERVAL seconds."""
+        while True:
+            try:
+                deleted = await self.purge_expired_metrics()
+                if deleted:
+                    logger.info(f"Purged {deleted} expired metrics")
+            except Exception as e:
+                logger.error(f"Failed to purge expired metrics: {str(e)}")
+            await asyncio.sleep(settings.ANALYTICS_PURGE_INTERVAL)
+    
+    async def purge_expired_metrics(self) -> int:
+        """Delete metrics older than ANALYTICS_RETENTION_DAYS (run by the purge task)."""
+        deleted = await self._write(self._purge_expired_metrics)
+        await _invalidate_cache(match=f"{CACHE_KEY_PREFIX}*")
+        return deleted
+    
+    def _purge_expired_metrics(self, db: sqlite3.Connection) -> int:
+        cutoff = datetime.utcnow() - timedelta(days=settings.ANALYTICS_RETENTION_DAYS)
+        
+        cursor = db.execute("DELETE FROM metrics WHERE timestamp < ?", (cutoff,))
+        db.execute("DELETE FROM metrics_hourly WHERE hour_bucket < ?", (_hour_bucket(cutoff),))
+        db.commit()
+        return cursor.rowcount
 
 class ReportGenerator:
     """Generate analytics reports."""
     
-    def __init__(self, db_path: str = ANALYTICS_DB_PATH):
-        self.db_path = db_path
+    def __init__(self, collector: AnalyticsCollector):
+        # Reuses the collector's read connections
+        self.collector = collector
     
     async def generate_daily_report(self, date: Optional[str] = None) -> DailyReport:
         """Generate daily system report."""
-        if date:
-            report_date = datetime.strptime(date, "%Y-%m-%d")
-        else:
-            report_date = datetime.utcnow().date()
-        
-        start_time = datetime.combine(report_date, datetime.min.time())
-        end_time = datetime.combine(report_date, datetime.max.time())
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            # Total users with activity
-            cursor = await db.execute(
-                "SELECT COUNT(DISTINCT user_id) FROM metrics WHERE timestamp >= ? AND timestamp <= ?",
-                (start_time, end_time)
-            )
-            total_users = (await cursor.fetchone())[0]
-            
-            # Aggregated stats
-            cursor = await db.execute("""
-                SELECT 
-                    type,
-                    COUNT(*) as count,
-                    SUM(value) as total_value
-                FROM metrics 
-                WHERE timestamp >= ? AND timestamp <= ?
-                GROUP BY type
-            """, (start_time, end_time))
-            
-            results = await cursor.fetchall()
-            stats = {row[0]: {"count": row[1], "total": row[2]} for row in results}
-            
-            # Top users by activity
-            cursor = await db.execute("""
-                SELECT user_id, COUNT(*) as activity_count, SUM(value) as total_value
-                FROM metrics 
-                WHERE timestamp >= ? AND timestamp <= ?
-                GROUP BY user_id 
-                ORDER BY activity_count DESC 
-                LIMIT 10
-            """, (start_time, end_time))
-            
-            top_users = [
-                {"user_id": row[0], "activity_count": row[1], "total_value": row[2]}
-                for row in await cursor.fetchall()
-            ]
-            
-            return DailyReport(
-                date=report_date.strftime("%Y-%m-%d"),
-                total_users=total_users,
-                total_api_calls=stats.get("api_call", {}).get("count", 0),
-                total_tool_executions=stats.get("tool_execution", {}).get("count", 0),
-                total_cost=stats.get("cost", {}).get("total", 0.0),
-                total_sessions=stats.get("session", {}).get("count", 0),
-                top_users=top_users
-            )
\ No newline at end of file
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        date = date or today
+        
+        key = _daily_report_key(date)
+        cached = await _cache_get(key)
+        if cached:
+            return DailyReport.model_validate_json(cached)
+        
+        report = await self._generate_daily_report(date)
+        # Past days are final; today's report keeps changing
+        ttl = DAILY_REPORT_CACHE_TTL if date < today else TODAY_REPORT_CACHE_TTL
+        await _cache_set(key, report.model_dump_json(), ttl)
+        return report
+    
+    async def _generate_daily_report(self, date: str) -> DailyReport:
+        report_date = datetime.strptime(date, "%Y-%m-%d")
+        buckets = _day_buckets(report_date)
+        
+        # The three queries are independent, so run them on separate pooled read connections
+        total_users, stats, top_users = await asyncio.gather(
+            self.collector._read(self._count_users, buckets),
+            self.collector._read(self._type_totals, buckets),
+            self.collector._read(self._top_users, buckets),
+        )
+        
+        return DailyReport(
+            date=report_date.strftime("%Y-%m-%d"),
+            total_users=total_users,
+            total_api_calls=stats.get("api_call", {}).get("count", 0),
+            total_tool_executions=stats.get("tool_execution", {}).get("count", 0),
+            total_cost=stats.get("cost", {}).get("total", 0.0),
+            total_sessions=stats.get("session", {}).get("count", 0),
+            top_users=top_users
+        )
+    
+    def _count_users(self, db: sqlite3.Connection, buckets: Tuple[int, int]) -> int:
+        """Total users with activity."""
+        return db.execute(DAILY_USER_COUNT_SQL, buckets).fetchone()[0]
+    
+    def _type_totals(self, db: sqlite3.Connection, buckets: Tuple[int, int]) -> Dict[str, Dict[str, Any]]:
+        """Aggregated stats per metric type."""
+        cursor = db.execute(DAILY_TYPE_TOTALS_SQL, buckets)
+        return {row[0]: {"count": row[1], "total": row[2]} for row in cursor}
+    
+    def _top_users(self, db: sqlite3.Connection, buckets: Tuple[int, int]) -> List[Dict[str, Any]]:
+        """Top users by activity."""
+        # Kept in a bounded heap as the groups stream in instead of sorting every user group
+        cursor = db.execute(DAILY_USER_TOTALS_SQL, buckets)
+        return [
+            {"user_id": row[0], "activity_count": row[1], "total_value": row[2]}
+            for row in heapq.nlargest(TOP_USERS_LIMIT, cursor, key=itemgetter(1))
+        ]
\ No newline at end of file
@@ -6,10 +6,17 @@ Unified database for Auth & Analytics services
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import text
-from sqlalchemy import String, DateTime, Integer, Text, Boolean, JSON
+from sqlalchemy.engine import make_url, Result
+from sqlalchemy.sql.expression import Executable, FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy import String, DateTime, Integer, Text, Boolean, JSON, Index
 from datetime import datetime
-from typing import AsyncGenerator, Dict, Any
+from typing import AsyncGenerator, Dict, Any, Iterable, List, Sequence
+from contextlib import AsyncExitStack
+import asyncio
 import logging
+import orjson
+import time
 
 from config import settings
 
@@ -23,10 +30,31 @@ class Base(DeclarativeBase):
     """Base model class"""
     pass
 
+class hour_trunc(FunctionElement):
+    """Timestamp truncated to the hour, usable as a GROUP BY bucket"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(hour_trunc)
+def _compile_hour_trunc(element, compiler, **kw):
+    return "date_trunc('hour', %s)" % compiler.process(element.clauses, **kw)
+
+@compiles(hour_trunc, "sqlite")
+def _compile_hour_trunc_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m-%%d %%H:00:00', %s)" % compiler.process(element.clauses, **kw)
+
 # Auth Models
 class User(Base):
     """User model for authentication"""
     __tablename__ = "platform_users"
+    __table_args__ = (
+        # Login lookups for active users answered from the index alone on Postgres
+        Index(
+            "ix_users_email_active", "email",
+            postgresql_include=["id", "password_hash", "first_name", "last_name", "is_active", "created_at"],
+            postgresql_where=text("is_active")
+        ),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
@@ -44,6 +72,12 @@ class User(Base):
 class AnalyticsEvent(Base):
     """Analytics event model"""
     __tablename__ = "platform_analytics_events"
+    __table_args__ = (
+        # Dashboard window counts: events and distinct users since a timestamp
+        Index("ix_events_ts_user", "timestamp", "user_id"),
+    )
+    # Fetch generated columns with INSERT ... RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, nullable=True)  # Can be anonymous
@@ -59,6 +93,15 @@ class AnalyticsEvent(Base):
 class AnalyticsMetric(Base):
     """Analytics metrics aggregation"""
     __tablename__ = "platform_analytics_metrics"
+    __table_args__ = (
+        # Dashboard window scan (endpoints, API call sums), index-only on Postgres
+        Index(
+            "ix_metrics_ts_endpoint", "timestamp", "endpoint",
+            postgresql_include=["metric_name", "metric_value"]
+        ),
+    )
+    # Fetch generated columns with INSERT ... RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     metric_name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -77,6 +120,10 @@ class AnalyticsMetric(Base):
 class AnalyticsUsage(Base):
     """User usage tracking"""
     __tablename__ = "platform_analytics_usage"
+    __table_args__ = (
+        # Per-user usage history: one range scan, already in date order
+        Index("ix_usage_user_period_date", "user_id", "period_type", "date"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -94,6 +141,9 @@ class AnalyticsUsage(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+def _json_dumps(value: Any) -> str:
+    return orjson.dumps(value).decode()
+
 async def init_db():
     """Initialize database connection and create tables"""
     global engine, async_session_maker
@@ -104,13 +154,31 @@ async def init_db():
         if database_url.startswith("postgresql://"):
             database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
         
+        # asyncpg statement caches: server-side prepared statements per connection,
+        # plus SQLAlchemy's cache of prepared statement handles
+        connect_args = {}
+        url = make_url(database_url)
+        if url.drivername == "postgresql+asyncpg":
+            connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+            if "prepared_statement_cache_size" not in url.query:
+                url = url.update_query_dict(
+                    {"prepared_statement_cache_size": str(settings.DB_PREPARED_STATEMENT_CACHE_SIZE)}
+                )
+        
         # Create async engine
         engine = create_async_engine(
-            database_url,
+            url,
             echo=settings.LOG_LEVEL == "DEBUG",
-            pool_size=5,
-            max_overflow=10,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
             pool_pre_ping=True,
+            pool_reset_on_return="rollback",
+            connect_args=connect_args,
+            # JSON columns (labels, event_data, meta_data) go through orjson
+            json_serializer=_json_dumps,
+            json_deserializer=orjson.loads,
         )
         
         # Create session maker
@@ -124,12 +192,19 @@ async def init_db():
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
         
+        await warm_pool(settings.DB_POOL_SIZE)
+        
         logger.info("✅ Database initialized successfully")
         
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {str(e)}")
         raise
 
+async def warm_pool(size: int):
+    """Open pooled connections up front so early requests skip the connect handshake"""
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(size)))
+
 async def close_db():
     """Close database connections"""
     global engine
@@ -139,7 +214,12 @@ async def close_db():
         logger.info("✅ Database connections closed")
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Get database session"""
+    """Get database session
+    
+    FastAPI caches dependencies per request, so a route and the auth
+    dependency it uses share this one session (and at most one pooled
+    connection, checked out on first use). Leaving the block closes it.
+    """
     if not async_session_maker:
         raise RuntimeError("Database not initialized")
     
@@ -149,8 +229,52 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         except Exception:
             await session.rollback()
             raise
-        finally:
-            await session.close()
+
+def supports_copy(session: AsyncSession) -> bool:
+    """Whether the session's engine can bulk load with COPY (asyncpg only)"""
+    return session.bind is not None and session.bind.dialect.driver == "asyncpg"
+
+async def bulk_insert_copy(
+    session: AsyncSession,
+    table: str,
+    records: Iterable[Sequence[Any]],
+    columns: List[str]
+) -> None:
+    """Bulk insert rows with PostgreSQL COPY inside the session's transaction
+    
+    The COPY runs on the raw asyncpg connection, which SQLAlchemy's driver
+    adapter does not see. The adapter only starts its asyncpg transaction on
+    the first statement it executes, so when the COPY would come first it is
+    started here; otherwise the COPY would autocommit by itself and the
+    session's commit or rollback would not cover it.
+    """
+    # Begins the session transaction and checks out its connection
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not driver_connection.is_in_transaction():
+        await connection.exec_driver_sql("SELECT 1")
+    await driver_connection.copy_records_to_table(
+        table,
+        records=records,
+        columns=columns
+    )
+
+def new_session() -> AsyncSession:
+    """Open a session independent of the request's get_db session; the caller closes it"""
+    if not async_session_maker:
+        raise RuntimeError("Database not initialized")
+    
+    return async_session_maker()
+
+async def execute_in_new_session(statement: Executable) -> Result:
+    """Execute a statement on its own session and connection
+    
+    AsyncSession is not safe for concurrent use; independent queries can be
+    gathered through this instead of sharing the request's session.
+    """
+    async with new_session() as session:
+        return await session.execute(statement)
 
 async def get_health_status() -> Dict[str, Any]:
     """Get database health status"""
@@ -175,36 +299,82 @@ async def get_health_status() -> Dict[str, Any]:
             "error": str(e)
         }
 
+def get_pool_status() -> Dict[str, Any]:
+    """Get connection pool counters"""
+    if not engine:
+        return {"status": "unavailable", "error": "Database not initialized"}
+    
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout": settings.DB_POOL_TIMEOUT,
+    }
+
 # Redis connection (for caching and sessions)
+redis_pool = None
 redis_client = None
+# Set between init_redis() and close_redis(); get_redis() only reconnects while set
+redis_enabled = False
+# Earliest monotonic time get_redis() may retry a failed connection
+redis_retry_at = 0.0
 
 async def init_redis():
-    """Initialize Redis connection"""
-    global redis_client
+    """Initialize Redis connection pool"""
+    global redis_pool, redis_client, redis_enabled, redis_retry_at
     
+    redis_enabled = True
+    redis_retry_at = time.monotonic() + settings.REDIS_RECONNECT_INTERVAL
     try:
         import redis.asyncio as redis
         
-        redis_client = redis.from_url(
+        pool = redis.ConnectionPool.from_url(
             settings.redis_url_with_password,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
             encoding="utf-8",
             decode_responses=True,
             socket_keepalive=True,
             socket_keepalive_options={},
             health_check_interval=30,
         )
+        client = redis.Redis(connection_pool=pool)
         
-        # Test connection
-        await redis_client.ping()
+        # Test connection before handing the client out
+        try:
+            await client.ping()
+        except Exception:
+            await client.aclose()
+            await pool.disconnect()
+            raise
+        redis_pool, redis_client = pool, client
         logger.info("✅ Redis initialized successfully")
         
     except Exception as e:
         logger.error(f"❌ Redis initialization failed: {str(e)}")
         # Don't raise - Redis is optional for basic functionality
+
+async def close_redis():
+    """Close Redis connection pool"""
+    global redis_pool, redis_client, redis_enabled
+    
+    redis_enabled = False
+    if redis_client:
+        await redis_client.aclose()
         redis_client = None
+    if redis_pool:
+        await redis_pool.disconnect()
+        redis_pool = None
 
 async def get_redis():
-    """Get Redis client"""
-    if not redis_client:
+    """Get Redis client (None while Redis is unavailable)
+    
+    If Redis was down at startup, the first caller after each
+    REDIS_RECONNECT_INTERVAL retries the connection; other callers get
+    None straight away instead of waiting on it.
+    """
+    if redis_client is None and redis_enabled and time.monotonic() >= redis_retry_at:
         await init_redis()
     return redis_client
\ No newline at end of file
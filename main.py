@@ -4,21 +4,23 @@ Consolidates authentication and analytics services into a single microservice
 Port: 8007, Routes: /auth/* and /analytics/*
 """
 
-from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
 import uvicorn
+import hmac
 import logging
 import time
-from typing import Optional
 
 # Route modules
-from routes.auth import router as auth_router
+from routes.auth import router as auth_router, init_password_hashing
 from routes.analytics import router as analytics_router
 from config import settings
-from database import init_db, close_db
+from database import init_db, close_db, init_redis, close_redis
+from analytics_collector import AnalyticsCollector
 
 # Configure logging
 logging.basicConfig(
@@ -29,6 +31,7 @@ logger = logging.getLogger(__name__)
 
 # Security
 security = HTTPBearer(auto_error=False)
+_API_KEY_BYTES = settings.API_KEY.encode()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,12 +40,23 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting PyAirtable Platform Services")
     await init_db()
     logger.info("✅ Database initialized")
+    await init_redis()
+    await init_password_hashing()
+    # SQLite metrics collector; also runs the retention purge in the background
+    app.state.analytics_collector = AnalyticsCollector()
+    await app.state.analytics_collector.init_db()
+    logger.info("✅ Analytics collector initialized")
     
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down Platform Services")
+    try:
+        await app.state.analytics_collector.close()
+    except Exception as e:
+        logger.error(f"❌ Analytics collector shutdown failed: {str(e)}")
     await close_db()
+    await close_redis()
     logger.info("✅ Cleanup completed")
 
 # Create FastAPI app
@@ -51,11 +65,37 @@ app = FastAPI(
     description="Unified Authentication & Analytics Service",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.ENVIRONMENT == "development" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
 )
 
+# API key validation
+class APIKeyASGIMiddleware:
+    """Verify the X-API-Key header on auth and analytics routes"""
+    
+    PROTECTED_PREFIXES = ("/auth/", "/analytics/")
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.PROTECTED_PREFIXES):
+            for name, value in scope["headers"]:
+                if name == b"x-api-key":
+                    # Constant-time comparison to prevent timing attacks
+                    if value and not hmac.compare_digest(_API_KEY_BYTES, value):
+                        response = ORJSONResponse({"detail": "Invalid API key"}, status_code=401)
+                        await response(scope, receive, send)
+                        return
+                    break
+        
+        await self.app(scope, receive, send)
+
 # Security middlewares
+if settings.REQUIRE_API_KEY:
+    app.add_middleware(APIKeyASGIMiddleware)
+
 if settings.ENVIRONMENT == "production":
     app.add_middleware(
         TrustedHostMiddleware,
@@ -73,35 +113,25 @@ app.add_middleware(
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    if not logger.isEnabledFor(logging.INFO):
+        return await call_next(request)
+    
+    start_time = time.perf_counter()
     
     response = await call_next(request)
     
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.3f}s"
+        "%s %s - Status: %s - Time: %.3fs",
+        request.method, request.scope["path"], response.status_code, process_time
     )
     
     return response
 
-# API key validation
-async def verify_api_key(request: Request) -> Optional[str]:
-    """Verify API key from header"""
-    api_key = request.headers.get("X-API-Key")
-    if not api_key:
-        return None
-    
-    # Constant-time comparison to prevent timing attacks
-    import hmac
-    expected = settings.API_KEY.encode()
-    provided = api_key.encode()
-    
-    if not hmac.compare_digest(expected, provided):
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
-    return api_key
+# Unhandled errors: JSON 500 for clients; Starlette re-raises so the server still logs the traceback
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    return ORJSONResponse({"detail": "Internal server error"}, status_code=500)
 
 # Health check endpoint
 @app.get("/health")
@@ -130,19 +160,25 @@ async def health_check():
         logger.error(f"Health check failed: {str(e)}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+# Connection pool introspection (development only)
+if settings.ENVIRONMENT == "development":
+    @app.get("/debug/pool", include_in_schema=False)
+    async def debug_pool():
+        """Database connection pool counters"""
+        from database import get_pool_status
+        return get_pool_status()
+
 # Include routers
 app.include_router(
     auth_router,
     prefix="/auth",
-    tags=["Authentication"],
-    dependencies=[Depends(verify_api_key)] if settings.REQUIRE_API_KEY else []
+    tags=["Authentication"]
 )
 
 app.include_router(
     analytics_router,
     prefix="/analytics", 
-    tags=["Analytics"],
-    dependencies=[Depends(verify_api_key)] if settings.REQUIRE_API_KEY else []
+    tags=["Analytics"]
 )
 
 # Legacy endpoint compatibility (backward compatibility)
@@ -168,6 +204,10 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8007,
+        loop="uvloop",
+        http="httptools",
+        # Reload runs a single process
+        workers=1 if settings.ENVIRONMENT == "development" else settings.WEB_CONCURRENCY,
         log_level=settings.LOG_LEVEL.lower(),
         reload=settings.ENVIRONMENT == "development"
     )
\ No newline at end of file
@@ -4,17 +4,28 @@ Unified data models for platform services (auth + analytics).
 from datetime import datetime
 from typing import Optional, Dict, Any
 from enum import Enum
-from pydantic import BaseModel, Field, EmailStr
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, create_engine
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Index, Enum as SAEnum
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
+import bcrypt
+
+from config import settings
+from validators import validate_email
 
 # Database setup
 Base = declarative_base()
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# === Enums ===
+
+class MetricType(str, Enum):
+    """Supported metric types."""
+    API_CALL = "api_call"
+    TOOL_EXECUTION = "tool_execution"
+    COST = "cost"
+    SESSION = "session"
 
 # === SQLAlchemy Models ===
 
@@ -31,25 +42,38 @@ class User(Base):
 class MetricRecord(Base):
     """SQLAlchemy Metric model."""
     __tablename__ = "metrics"
+    __table_args__ = (
+        # Key lookups inside metadata (Postgres only)
+        Index("ix_metrics_meta_gin", "meta_data", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    type = Column(String(50), nullable=False, index=True)
+    # Native enum on Postgres; stores the lowercase values, not the member names
+    type = Column(
+        SAEnum(MetricType, name="metric_type_enum", values_callable=lambda e: [m.value for m in e]),
+        nullable=False,
+        index=True
+    )
     value = Column(Float, nullable=False)
     user_id = Column(String(255), nullable=False, index=True)
-    meta_data = Column(Text)  # JSON string
+    meta_data = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 # === Pydantic Models - Auth ===
 
 class UserCreate(BaseModel):
     """Pydantic model for user creation."""
-    email: EmailStr
+    email: str
     password: str
+    
+    _check_email = field_validator("email")(validate_email)
 
 class UserUpdate(BaseModel):
     """Pydantic model for user updates."""
-    email: Optional[EmailStr] = None
+    email: Optional[str] = None
     password: Optional[str] = None
+    
+    _check_email = field_validator("email")(validate_email)
 
 class UserResponse(BaseModel):
     """Pydantic model for user response."""
@@ -67,13 +91,6 @@ class Token(BaseModel):
 
 # === Pydantic Models - Analytics ===
 
-class MetricType(str, Enum):
-    """Supported metric types."""
-    API_CALL = "api_call"
-    TOOL_EXECUTION = "tool_execution"
-    COST = "cost"
-    SESSION = "session"
-
 class MetricRequest(BaseModel):
     """Request model for recording metrics."""
     type: MetricType
@@ -136,20 +153,34 @@ class HealthStatus(BaseModel):
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=settings.PASSWORD_HASH_ROUNDS)).decode()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 # === Database Setup Function ===
 
-def create_database_session(database_url: str):
-    """Create database engine and session."""
-    engine = create_engine(database_url, connect_args={"check_same_thread": False})
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async def create_database_session(database_url: str):
+    """Create async database engine and session factory.
+    
+    Expects an async driver URL (postgresql+asyncpg:// or sqlite+aiosqlite://).
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        engine_args = {"connect_args": {"check_same_thread": False}}
+    else:
+        engine_args = {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+        }
+    
+    engine = create_async_engine(url, pool_pre_ping=True, **engine_args)
+    SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
     
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     
     return engine, SessionLocal
\ No newline at end of file
@@ -3,20 +3,42 @@ Analytics routes for Platform Services
 Event tracking, metrics collection, and usage analytics
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc, and_
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
+import asyncio
+import heapq
 import logging
+import orjson
+from collections import defaultdict
 from datetime import datetime, timedelta
 
-from database import get_db, AnalyticsEvent, AnalyticsMetric, AnalyticsUsage, get_redis
+from database import (
+    get_db, AnalyticsEvent, AnalyticsMetric, AnalyticsUsage, get_redis,
+    supports_copy, bulk_insert_copy, execute_in_new_session, new_session, hour_trunc
+)
 from config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Redis list of the latest EventResponse JSON documents, newest first
+RECENT_EVENTS_KEY = "recent_events"
+RECENT_EVENTS_LIMIT = 10
+
+# Dashboard aggregates are cached per window size for a short time
+DASHBOARD_CACHE_TTL = 30
+
+# Batches at least this large are loaded with COPY instead of INSERTs
+COPY_BATCH_THRESHOLD = 100
+METRIC_COPY_COLUMNS = [
+    "metric_name", "metric_value", "metric_type", "user_id",
+    "service_name", "endpoint", "labels", "timestamp"
+]
+
 # Pydantic models
 class EventCreate(BaseModel):
     event_type: str
@@ -71,6 +93,13 @@ class DashboardMetrics(BaseModel):
     top_endpoints: List[Dict[str, Any]]
     recent_events: List[EventResponse]
 
+# Columns selected by the read endpoints, matching the response model fields
+METRIC_RESPONSE_COLUMNS = [getattr(AnalyticsMetric, name) for name in MetricResponse.model_fields]
+USAGE_RESPONSE_COLUMNS = [getattr(AnalyticsUsage, name) for name in UsageResponse.model_fields]
+
+# Rows fetched per round trip when streaming metrics
+METRICS_STREAM_BATCH = 500
+
 # Helper functions
 def get_client_ip(request: Request) -> str:
     """Extract client IP address from request"""
@@ -83,11 +112,68 @@ def get_user_agent(request: Request) -> str:
     """Extract user agent from request"""
     return request.headers.get("User-Agent", "unknown")
 
+async def stream_metrics(session: AsyncSession, result) -> AsyncIterator[bytes]:
+    """Encode streamed metric rows as {"metrics": [...], "count": N}, then close the session
+    
+    The 200 status is already sent once the body starts, so a failure while
+    fetching rows is logged and re-raised; the server then aborts the
+    response and clients see a truncated body rather than a short list.
+    """
+    count = 0
+    try:
+        yield b'{"metrics":['
+        async for row in result.mappings():
+            if count:
+                yield b","
+            yield orjson.dumps(dict(row))
+            count += 1
+        yield b'],"count":%d}' % count
+    except Exception as e:
+        logger.error(f"Metrics stream aborted after {count} rows: {str(e)}")
+        raise
+    finally:
+        await session.close()
+
+async def cache_recent_event(event_json: str):
+    """Push an event onto the Redis recent events list (best effort)"""
+    redis = await get_redis()
+    if not redis:
+        return
+    
+    try:
+        # One round trip for both commands
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(RECENT_EVENTS_KEY, event_json)
+            pipe.ltrim(RECENT_EVENTS_KEY, 0, 99)  # Keep last 100 events
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to cache event in Redis: {str(e)}")
+
+async def get_cached_recent_events(start_time: datetime) -> Optional[List[EventResponse]]:
+    """Recent events since start_time from Redis, or None if the cache can't answer"""
+    redis = await get_redis()
+    if not redis:
+        return None
+    
+    try:
+        entries = await redis.lrange(RECENT_EVENTS_KEY, 0, RECENT_EVENTS_LIMIT - 1)
+        events = [EventResponse.model_validate_json(entry) for entry in entries]
+    except Exception as e:
+        logger.warning(f"Failed to read recent events from Redis: {str(e)}")
+        return None
+    
+    # A short list only covers the window if it already reaches past start_time
+    if len(events) < RECENT_EVENTS_LIMIT and (not events or events[-1].timestamp >= start_time):
+        return None
+    
+    return [event for event in events if event.timestamp >= start_time]
+
 # Analytics endpoints
 @router.post("/events", response_model=EventResponse)
 async def track_event(
     event: EventCreate,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Track analytics event"""
@@ -102,28 +188,12 @@ async def track_event(
             user_agent=get_user_agent(request)
         )
         
+        # id comes back from the INSERT and the defaults are set client-side,
+        # so there is nothing to refresh after commit
         db.add(analytics_event)
         await db.commit()
-        await db.refresh(analytics_event)
-        
-        # Cache recent events in Redis for dashboard
-        redis = await get_redis()
-        if redis:
-            try:
-                event_data = {
-                    "id": analytics_event.id,
-                    "event_type": analytics_event.event_type,
-                    "user_id": analytics_event.user_id,
-                    "timestamp": analytics_event.timestamp.isoformat()
-                }
-                await redis.lpush("recent_events", str(event_data))
-                await redis.ltrim("recent_events", 0, 99)  # Keep last 100 events
-            except Exception as e:
-                logger.warning(f"Failed to cache event in Redis: {str(e)}")
         
-        logger.info(f"Event tracked: {event.event_type} for user {event.user_id}")
-        
-        return EventResponse(
+        response = EventResponse(
             id=analytics_event.id,
             event_type=analytics_event.event_type,
             event_data=analytics_event.event_data,
@@ -132,6 +202,13 @@ async def track_event(
             timestamp=analytics_event.timestamp
         )
         
+        # Cache recent events in Redis for dashboard, after the response is sent
+        background_tasks.add_task(cache_recent_event, response.model_dump_json())
+        
+        logger.info(f"Event tracked: {event.event_type} for user {event.user_id}")
+        
+        return response
+        
     except Exception as e:
         logger.error(f"Event tracking error: {str(e)}")
         await db.rollback()
@@ -156,7 +233,6 @@ async def create_metric(
         
         db.add(analytics_metric)
         await db.commit()
-        await db.refresh(analytics_metric)
         
         logger.debug(f"Metric created: {metric.metric_name} = {metric.metric_value}")
         
@@ -184,6 +260,29 @@ async def create_metrics_batch(
 ):
     """Create multiple metrics in batch"""
     try:
+        if len(batch.metrics) >= COPY_BATCH_THRESHOLD and supports_copy(db):
+            # COPY skips the ORM, so fill in the column defaults here
+            timestamp = datetime.utcnow()
+            records = [
+                (
+                    m.metric_name,
+                    m.metric_value,
+                    m.metric_type,
+                    m.user_id,
+                    m.service_name,
+                    m.endpoint,
+                    orjson.dumps(m.labels or {}).decode(),
+                    timestamp
+                )
+                for m in batch.metrics
+            ]
+            await bulk_insert_copy(db, AnalyticsMetric.__tablename__, records, METRIC_COPY_COLUMNS)
+            await db.commit()
+            
+            logger.info(f"Batch copied {len(records)} metrics")
+            
+            return {"message": f"Created {len(records)} metrics successfully"}
+        
         metrics = []
         for metric_data in batch.metrics:
             metric = AnalyticsMetric(
@@ -214,12 +313,11 @@ async def get_metrics(
     metric_name: Optional[str] = None,
     service_name: Optional[str] = None,
     user_id: Optional[int] = None,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    limit: int = 100
 ):
     """Get analytics metrics with filtering"""
     try:
-        query = select(AnalyticsMetric).order_by(desc(AnalyticsMetric.timestamp))
+        query = select(*METRIC_RESPONSE_COLUMNS).order_by(desc(AnalyticsMetric.timestamp))
         
         # Apply filters
         if metric_name:
@@ -229,27 +327,21 @@ async def get_metrics(
         if user_id:
             query = query.where(AnalyticsMetric.user_id == user_id)
         
-        query = query.limit(limit)
+        query = query.limit(limit).execution_options(yield_per=METRICS_STREAM_BATCH)
         
-        result = await db.execute(query)
-        metrics = result.scalars().all()
+        # The body is streamed after this returns, so it reads from a session of
+        # its own rather than get_db's: from FastAPI 0.106 on, yield dependencies
+        # are torn down before the response is sent, closing that session under
+        # the open cursor. stream_metrics closes this one when it finishes.
+        session = new_session()
+        try:
+            # Open the cursor here so query errors still become a 500
+            result = await session.stream(query)
+        except Exception:
+            await session.close()
+            raise
         
-        return {
-            "metrics": [
-                MetricResponse(
-                    id=m.id,
-                    metric_name=m.metric_name,
-                    metric_value=m.metric_value,
-                    metric_type=m.metric_type,
-                    user_id=m.user_id,
-                    service_name=m.service_name,
-                    endpoint=m.endpoint,
-                    labels=m.labels,
-                    timestamp=m.timestamp
-                ) for m in metrics
-            ],
-            "count": len(metrics)
-        }
+        return StreamingResponse(stream_metrics(session, result), media_type="application/json")
         
     except Exception as e:
         logger.error(f"Metrics retrieval error: {str(e)}")
@@ -269,7 +361,7 @@ async def get_user_usage(
         start_date = end_date - timedelta(days=days)
         
         # Query usage data
-        query = select(AnalyticsUsage).where(
+        query = select(*USAGE_RESPONSE_COLUMNS).where(
             and_(
                 AnalyticsUsage.user_id == user_id,
                 AnalyticsUsage.period_type == period_type,
@@ -279,18 +371,9 @@ async def get_user_usage(
         ).order_by(desc(AnalyticsUsage.date))
         
         result = await db.execute(query)
-        usage_records = result.scalars().all()
-        
-        return [
-            UsageResponse(
-                user_id=record.user_id,
-                api_calls_count=record.api_calls_count,
-                tokens_used=record.tokens_used,
-                cost_usd=record.cost_usd,
-                date=record.date,
-                period_type=record.period_type
-            ) for record in usage_records
-        ]
+        
+        # response_model validates and serializes the row mappings once
+        return result.mappings().all()
         
     except Exception as e:
         logger.error(f"User usage retrieval error: {str(e)}")
@@ -308,38 +391,27 @@ async def get_costs(
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Base query for usage data
-        query = select(AnalyticsUsage).where(
-            and_(
-                AnalyticsUsage.date >= start_date,
-                AnalyticsUsage.date <= end_date
-            )
-        )
-        
+        # Aggregate per user in the database; the summary is the sum of those rows
+        filters = [
+            AnalyticsUsage.date >= start_date,
+            AnalyticsUsage.date <= end_date
+        ]
         if user_id:
-            query = query.where(AnalyticsUsage.user_id == user_id)
+            filters.append(AnalyticsUsage.user_id == user_id)
         
-        result = await db.execute(query)
-        usage_records = result.scalars().all()
-        
-        # Calculate totals
-        total_cost = sum(record.cost_usd for record in usage_records)
-        total_tokens = sum(record.tokens_used for record in usage_records)
-        total_api_calls = sum(record.api_calls_count for record in usage_records)
-        
-        # Group by user for breakdown
-        user_costs = {}
-        for record in usage_records:
-            if record.user_id not in user_costs:
-                user_costs[record.user_id] = {
-                    "user_id": record.user_id,
-                    "total_cost": 0.0,
-                    "total_tokens": 0,
-                    "total_api_calls": 0
-                }
-            user_costs[record.user_id]["total_cost"] += record.cost_usd
-            user_costs[record.user_id]["total_tokens"] += record.tokens_used
-            user_costs[record.user_id]["total_api_calls"] += record.api_calls_count
+        breakdown_query = select(
+            AnalyticsUsage.user_id,
+            func.sum(AnalyticsUsage.cost_usd).label("total_cost"),
+            func.sum(AnalyticsUsage.tokens_used).label("total_tokens"),
+            func.sum(AnalyticsUsage.api_calls_count).label("total_api_calls")
+        ).where(and_(*filters)).group_by(AnalyticsUsage.user_id)
+        
+        result = await db.execute(breakdown_query)
+        user_breakdown = [row._asdict() for row in result]
+        
+        total_cost = sum(row["total_cost"] or 0.0 for row in user_breakdown)
+        total_tokens = sum(row["total_tokens"] or 0 for row in user_breakdown)
+        total_api_calls = sum(row["total_api_calls"] or 0 for row in user_breakdown)
         
         return {
             "summary": {
@@ -350,7 +422,7 @@ async def get_costs(
                 "cost_per_token": round(total_cost / total_tokens, 6) if total_tokens > 0 else 0,
                 "cost_per_api_call": round(total_cost / total_api_calls, 4) if total_api_calls > 0 else 0
             },
-            "user_breakdown": list(user_costs.values()),
+            "user_breakdown": user_breakdown,
             "period": {
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat()
@@ -362,85 +434,94 @@ async def get_costs(
         raise HTTPException(status_code=500, detail="Cost analysis failed")
 
 @router.get("/dashboard", response_model=DashboardMetrics)
-async def get_dashboard_metrics(
-    hours: int = 24,
-    db: AsyncSession = Depends(get_db)
-):
+async def get_dashboard_metrics(hours: int = 24):
     """Get dashboard metrics for the last N hours"""
     try:
+        cache_key = f"dashboard:{hours}"
+        redis = await get_redis()
+        if redis:
+            try:
+                cached = await redis.get(cache_key)
+                if cached:
+                    return DashboardMetrics.model_validate_json(cached)
+            except Exception as e:
+                logger.warning(f"Failed to read dashboard cache: {str(e)}")
+        
         # Calculate time range
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
         
-        # Count total events
-        events_query = select(func.count(AnalyticsEvent.id)).where(
+        # Count total events and active users in one scan (COUNT DISTINCT skips NULL users)
+        events_query = select(
+            func.count(AnalyticsEvent.id),
+            func.count(func.distinct(AnalyticsEvent.user_id))
+        ).where(
             AnalyticsEvent.timestamp >= start_time
         )
-        total_events_result = await db.execute(events_query)
-        total_events = total_events_result.scalar() or 0
-        
-        # Count active users
-        active_users_query = select(func.count(func.distinct(AnalyticsEvent.user_id))).where(
-            and_(
-                AnalyticsEvent.timestamp >= start_time,
-                AnalyticsEvent.user_id.isnot(None)
-            )
-        )
-        active_users_result = await db.execute(active_users_query)
-        active_users = active_users_result.scalar() or 0
-        
-        # Get API call metrics
-        api_calls_query = select(func.sum(AnalyticsMetric.metric_value)).where(
-            and_(
-                AnalyticsMetric.metric_name == "api_calls",
-                AnalyticsMetric.timestamp >= start_time
-            )
-        )
-        api_calls_result = await db.execute(api_calls_query)
-        total_api_calls = int(api_calls_result.scalar() or 0)
         
         # Get cost metrics
         cost_query = select(func.sum(AnalyticsUsage.cost_usd)).where(
             AnalyticsUsage.date >= start_time.date()
         )
-        cost_result = await db.execute(cost_query)
-        total_cost = float(cost_result.scalar() or 0.0)
         
-        # Get top endpoints
-        endpoints_query = select(
+        # Get per-endpoint hourly counts and API call sums in one scan of the window;
+        # top endpoints and the API call total are rolled up from these groups
+        metrics_query = select(
             AnalyticsMetric.endpoint,
-            func.count(AnalyticsMetric.id).label('count')
+            hour_trunc(AnalyticsMetric.timestamp).label('hour'),
+            func.count(AnalyticsMetric.id).label('count'),
+            func.sum(AnalyticsMetric.metric_value).label('total'),
+            func.sum(AnalyticsMetric.metric_value).filter(
+                AnalyticsMetric.metric_name == "api_calls"
+            ).label('api_calls')
         ).where(
-            and_(
-                AnalyticsMetric.timestamp >= start_time,
-                AnalyticsMetric.endpoint.isnot(None)
+            AnalyticsMetric.timestamp >= start_time
+        ).group_by(AnalyticsMetric.endpoint, 'hour').order_by('hour')
+        
+        queries = [events_query, cost_query, metrics_query]
+        
+        # Get recent events, from the Redis list when it covers the window
+        recent_events = await get_cached_recent_events(start_time)
+        if recent_events is None:
+            queries.append(
+                select(AnalyticsEvent).where(
+                    AnalyticsEvent.timestamp >= start_time
+                ).order_by(desc(AnalyticsEvent.timestamp)).limit(RECENT_EVENTS_LIMIT)
             )
-        ).group_by(AnalyticsMetric.endpoint).order_by(desc('count')).limit(5)
         
-        endpoints_result = await db.execute(endpoints_query)
+        # The queries are independent, so run them concurrently on separate connections
+        results = await asyncio.gather(*(execute_in_new_session(query) for query in queries))
+        
+        total_events, active_users = results[0].one()
+        total_cost = float(results[1].scalar() or 0.0)
+        total_api_calls = 0
+        endpoints = defaultdict(lambda: {"count": 0, "hourly": []})
+        for row in results[2]:
+            total_api_calls += row.api_calls or 0
+            if row.endpoint is None:
+                continue
+            entry = endpoints[row.endpoint]
+            entry["count"] += row.count
+            entry["hourly"].append({"hour": row.hour, "count": row.count, "total": row.total})
         top_endpoints = [
-            {"endpoint": row.endpoint, "count": row.count}
-            for row in endpoints_result
+            {"endpoint": endpoint, **entry}
+            for endpoint, entry in heapq.nlargest(5, endpoints.items(), key=lambda item: item[1]["count"])
         ]
-        
-        # Get recent events
-        recent_events_query = select(AnalyticsEvent).where(
-            AnalyticsEvent.timestamp >= start_time
-        ).order_by(desc(AnalyticsEvent.timestamp)).limit(10)
-        
-        recent_events_result = await db.execute(recent_events_query)
-        recent_events = [
-            EventResponse(
-                id=event.id,
-                event_type=event.event_type,
-                event_data=event.event_data,
-                user_id=event.user_id,
-                session_id=event.session_id,
-                timestamp=event.timestamp
-            ) for event in recent_events_result.scalars()
-        ]
-        
-        return DashboardMetrics(
+        total_api_calls = int(total_api_calls)
+        
+        if recent_events is None:
+            recent_events = [
+                EventResponse(
+                    id=event.id,
+                    event_type=event.event_type,
+                    event_data=event.event_data,
+                    user_id=event.user_id,
+                    session_id=event.session_id,
+                    timestamp=event.timestamp
+                ) for event in results[3].scalars()
+            ]
+        
+        dashboard = DashboardMetrics(
             total_events=total_events,
             active_users=active_users,
             total_api_calls=total_api_calls,
@@ -449,6 +530,14 @@ async def get_dashboard_metrics(
             recent_events=recent_events
         )
         
+        if redis:
+            try:
+                await redis.set(cache_key, dashboard.model_dump_json(), ex=DASHBOARD_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Failed to cache dashboard metrics: {str(e)}")
+        
+        return dashboard
+        
     except Exception as e:
         logger.error(f"Dashboard metrics error: {str(e)}")
         raise HTTPException(status_code=500, detail="Dashboard metrics retrieval failed")
\ No newline at end of file
@@ -3,42 +3,129 @@ Authentication routes for Platform Services
 JWT-based authentication with user management
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.security import HTTPBearer
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict, Any
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pydantic import BaseModel, AfterValidator, ConfigDict, StringConstraints
+from typing import Annotated, Optional, Dict, Any
+from dataclasses import dataclass
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
 import bcrypt
+import hashlib
+import hmac
 import jwt
+from jwt.algorithms import get_default_algorithms
 import logging
-from datetime import datetime, timedelta
+import orjson
+import os
+import time
+from datetime import datetime
 
-from database import get_db, User
+from database import get_db, get_redis, User
+from validators import validate_email
 from config import settings
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
-security = HTTPBearer()
+router = APIRouter(default_response_class=ORJSONResponse)
+# Parses "Authorization: Bearer <token>"; missing credentials are reported as 401 below
+security = HTTPBearer(auto_error=False)
+
+# Email syntax check shared with models.py; cheaper per request than EmailStr/email-validator
+Email = Annotated[str, StringConstraints(strip_whitespace=True), AfterValidator(validate_email)]
+
+# bcrypt only uses the first 72 bytes; the cap stops oversized bodies reaching the hasher
+Password = Annotated[str, StringConstraints(max_length=128)]
+
+# New passwords also enforce the minimum length, rejected (422) before the handler runs
+NewPassword = Annotated[str, StringConstraints(min_length=settings.PASSWORD_MIN_LENGTH, max_length=128)]
+
+# Request bodies: any string field longer than an email address can be is rejected up front
+_INPUT_CONFIG = ConfigDict(str_max_length=320)
+
+# Process-local auth caches: sha256(token) -> (user_id, exp) and
+# user_id -> (AuthUser, generation). Keys are token digests so raw tokens are
+# not retained in memory.
+_payload_cache: TTLCache = TTLCache(maxsize=10000, ttl=settings.AUTH_CACHE_TTL)
+_user_cache: TTLCache = TTLCache(maxsize=5000, ttl=settings.AUTH_CACHE_TTL)
+
+# Per-user generation counters in Redis, bumped whenever a user row changes. A
+# worker only trusts its cached AuthUser while the generation it was cached under
+# is still current, so a deactivation through one worker reaches all of them.
+USER_GENERATION_KEY_PREFIX = "auth:user_gen:"
+
+def _user_generation_key(user_id: int) -> str:
+    return f"{USER_GENERATION_KEY_PREFIX}{user_id}"
+
+async def _user_generation(user_id: int) -> Optional[int]:
+    """Current generation of a user, or None if Redis is unavailable (user cache bypassed)"""
+    redis = await get_redis()
+    if not redis:
+        return None
+    
+    try:
+        return int(await redis.get(_user_generation_key(user_id)) or 0)
+    except Exception as e:
+        logger.warning(f"Failed to read user generation from Redis: {str(e)}")
+        return None
+
+async def invalidate_user_cache(user_id: int) -> None:
+    """Drop a cached user here and, by bumping its generation, in every other worker"""
+    _user_cache.pop(user_id, None)
+    redis = await get_redis()
+    if not redis:
+        return
+    
+    try:
+        # Outlives every cache entry tagged with an older generation
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.incr(_user_generation_key(user_id))
+            pipe.expire(_user_generation_key(user_id), 2 * settings.AUTH_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to bump user generation in Redis: {str(e)}")
 
 # Pydantic models
 class UserCreate(BaseModel):
-    email: EmailStr
-    password: str
+    model_config = _INPUT_CONFIG
+    
+    email: Email
+    password: NewPassword
     first_name: Optional[str] = None
     last_name: Optional[str] = None
 
 class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
+    model_config = _INPUT_CONFIG
+    
+    email: Email
+    password: Password
 
 class UserProfile(BaseModel):
-    email: EmailStr
+    model_config = _INPUT_CONFIG
+    
+    email: Email
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     is_active: bool = True
 
 class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    email: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_active: bool
+    created_at: datetime
+
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    """Authenticated user as loaded by get_current_user (plain row, no ORM state)"""
     id: int
     email: str
     first_name: Optional[str]
@@ -53,241 +140,371 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 # Auth utilities
-def hash_password(password: str) -> str:
+# bcrypt is deliberately slow and releases the GIL, so hashing runs on its own
+# pool sized to the CPU count instead of blocking the event loop
+_pw_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="bcrypt")
+
+# bcrypt cost for new hashes; init_password_hashing may raise it at startup
+_hash_rounds = settings.PASSWORD_HASH_ROUNDS
+# Checked for unknown emails at that same cost; also set by init_password_hashing
+_dummy_password_hash: Optional[str] = None
+
+def _hash_password(password: bytes) -> bytes:
+    """bcrypt hash with a fresh salt (runs on the password pool)"""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=_hash_rounds))
+
+def calibrate_bcrypt_rounds(target_ms: int, min_rounds: int = 10, max_rounds: int = 16) -> int:
+    """Largest bcrypt cost (at least min_rounds) that hashes within target_ms on this host"""
+    rounds = min_rounds
+    for candidate in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"benchmark", bcrypt.gensalt(rounds=candidate))
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds = candidate
+    return rounds
+
+async def init_password_hashing() -> None:
+    """Set the bcrypt cost and hash the login timing dummy with it (run once at startup)
+    
+    With PASSWORD_HASH_TARGET_MS set, the cost is calibrated to it but never
+    goes below PASSWORD_HASH_MIN_ROUNDS, which defaults to PASSWORD_HASH_ROUNDS;
+    operators lower it to allow a cheaper cost.
+    """
+    global _hash_rounds, _dummy_password_hash
+    if settings.PASSWORD_HASH_TARGET_MS:
+        _hash_rounds = await asyncio.to_thread(
+            calibrate_bcrypt_rounds, settings.PASSWORD_HASH_TARGET_MS, max(settings.PASSWORD_HASH_MIN_ROUNDS, 10)
+        )
+        logger.info(f"✅ bcrypt cost calibrated to {_hash_rounds} rounds")
+    
+    # Hashed after calibration so unknown emails cost the same as real accounts
+    _dummy_password_hash = await hash_password("dummy-password-for-timing")
+
+async def hash_password(password: str) -> str:
     """Hash password using bcrypt"""
-    salt = bcrypt.gensalt(rounds=settings.PASSWORD_HASH_ROUNDS)
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(_pw_executor, _hash_password, password.encode('utf-8'))
+    return hashed.decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+async def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _pw_executor, bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8')
+    )
+
+# Emails with no active account, kept in Redis so every worker sees register's eviction.
+# Keys are email digests; all helpers are best effort and fall back to the database.
+UNKNOWN_EMAIL_KEY_PREFIX = "auth:unknown_email:"
+# Key values: a cached login miss, or the tombstone register leaves in its place.
+# A login whose lookup ran before the registration committed may write its miss
+# afterwards; the miss is written with NX, so it cannot replace the tombstone.
+_UNKNOWN_EMAIL = "unknown"
+_REGISTERED_EMAIL = "registered"
+
+def _unknown_email_key(email: str) -> str:
+    return UNKNOWN_EMAIL_KEY_PREFIX + hashlib.sha256(email.encode()).hexdigest()
+
+async def _is_unknown_email(email: str) -> bool:
+    """Whether a recent login already found no active account for this email"""
+    redis = await get_redis()
+    if not redis:
+        return False
+    
+    try:
+        return await redis.get(_unknown_email_key(email)) == _UNKNOWN_EMAIL
+    except Exception as e:
+        logger.warning(f"Failed to read unknown email cache from Redis: {str(e)}")
+        return False
+
+async def _remember_unknown_email(email: str):
+    """Cache a login miss so repeat attempts skip the database (unless register got there first)"""
+    redis = await get_redis()
+    if not redis:
+        return
+    
+    try:
+        await redis.set(_unknown_email_key(email), _UNKNOWN_EMAIL, ex=settings.AUTH_CACHE_TTL, nx=True)
+    except Exception as e:
+        logger.warning(f"Failed to cache unknown email in Redis: {str(e)}")
+
+async def _mark_email_registered(email: str):
+    """Replace any cached login miss with a tombstone once the email is registered"""
+    redis = await get_redis()
+    if not redis:
+        return
+    
+    try:
+        await redis.set(_unknown_email_key(email), _REGISTERED_EMAIL, ex=settings.AUTH_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to clear unknown email in Redis: {str(e)}")
+
+async def _verify_dummy_password(password: str) -> None:
+    """Spend one bcrypt check for unknown emails so they take as long as real accounts"""
+    await verify_password(password, _dummy_password_hash)
+
+# Auth lookups, built once; each request only binds the key.
+# Active user by primary key, columns in AuthUser field order
+_AUTH_USER_BY_ID = select(
+    User.id, User.email, User.first_name, User.last_name, User.is_active, User.created_at
+).where(User.id == bindparam("user_id"), User.is_active)
+
+# Active user by email for /login, all columns covered by ix_users_email_active
+_LOGIN_BY_EMAIL = select(
+    User.id, User.email, User.password_hash, User.first_name,
+    User.last_name, User.is_active, User.created_at
+).where(User.email == bindparam("email"), User.is_active)
+
+# JWT key prepared once (encoded/parsed by the algorithm) rather than on every call
+_JWT_ALGORITHMS = [settings.JWT_ALGORITHM]
+_JWT_KEY = get_default_algorithms()[settings.JWT_ALGORITHM].prepare_key(settings.JWT_SECRET)
+
+# The HS256 header never changes, so its encoded segment is computed once
+_HS256_HEADER_SEGMENT = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+def _b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _encode_hs256(payload: Dict[str, Any]) -> str:
+    """Sign an HS256 token: static header segment, orjson payload, one OpenSSL HMAC
+    
+    Matches jwt.encode byte for byte only for ASCII claims: orjson writes
+    non-ASCII characters as raw UTF-8 where PyJWT escapes them as \\uXXXX.
+    Both forms are valid JWTs and decode to the same claims either way.
+    """
+    signing_input = _HS256_HEADER_SEGMENT + b"." + _b64url_encode(orjson.dumps(payload))
+    signature = hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url_encode(signature)).decode()
 
 def create_jwt_token(user: User) -> str:
     """Create JWT token for user"""
+    now = int(time.time())
     payload = {
         "sub": str(user.id),
         "email": user.email,
-        "iat": datetime.utcnow(),
-        "exp": datetime.utcnow() + timedelta(seconds=settings.jwt_expires_seconds),
+        "iat": now,
+        "exp": now + settings.jwt_expires_seconds,
         "type": "access"
     }
     
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    if settings.JWT_ALGORITHM == "HS256":
+        return _encode_hs256(payload)
+    return jwt.encode(payload, _JWT_KEY, algorithm=settings.JWT_ALGORITHM)
 
-async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> User:
-    """Get current user from JWT token"""
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _decode_hs256(token: str) -> Dict[str, Any]:
+    """Verify an HS256 token inline: one OpenSSL HMAC, orjson parse, PyJWT's time-claim rules"""
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-        
-        token = auth_header.split(" ")[1]
-        
-        # Decode JWT token
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        user_id = int(payload.get("sub"))
+        signing_input, _, signature = token.rpartition(".")
+        header_segment, _, payload_segment = signing_input.partition(".")
+        header = orjson.loads(_b64url_decode(header_segment))
+        payload = orjson.loads(_b64url_decode(payload_segment))
+        signature = _b64url_decode(signature)
+    except ValueError:
+        raise jwt.DecodeError("Invalid token")
+    
+    if not isinstance(header, dict) or header.get("alg") != "HS256" or not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid token")
+    
+    expected = hmac.new(_JWT_KEY, signing_input.encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    
+    now = time.time()
+    try:
+        if "exp" in payload and int(payload["exp"]) <= now:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        if "iat" in payload and int(payload["iat"]) > now:
+            raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+        if "nbf" in payload and int(payload["nbf"]) > now:
+            raise jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+    except (TypeError, ValueError):
+        raise jwt.DecodeError("Invalid time claim")
+    
+    return payload
+
+def decode_jwt_token(token: str) -> Dict[str, Any]:
+    """Verify and decode a JWT (inline fast path for HS256, PyJWT otherwise)"""
+    if settings.JWT_ALGORITHM == "HS256":
+        return _decode_hs256(token)
+    return jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS)
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> AuthUser:
+    """Get current user from JWT token"""
+    # Get token from Authorization header
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    
+    token = credentials.credentials
+    token_key = hashlib.sha256(token.encode()).digest()
+    
+    # Decode JWT token, unless it was verified recently and has not expired since
+    cached = _payload_cache.get(token_key)
+    if cached and cached[1] > time.time():
+        user_id = cached[0]
+    else:
+        try:
+            payload = decode_jwt_token(token)
+            user_id = int(payload["sub"])
+            expires_at = int(payload["exp"])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid token payload")
         
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token payload")
         
-        # Get user from database
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        
-        if not user or not user.is_active:
-            raise HTTPException(status_code=401, detail="User not found or inactive")
-        
-        return user
-        
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception as e:
-        logger.error(f"Authentication error: {str(e)}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
+        _payload_cache[token_key] = (user_id, expires_at)
+    
+    # Get user from cache or database. The generation is read before the row, so
+    # a change committed in between leaves the entry stale and it is reloaded.
+    generation = await _user_generation(user_id)
+    cached = _user_cache.get(user_id) if generation is not None else None
+    if cached and cached[1] == generation:
+        user = cached[0]
+    else:
+        result = await db.execute(_AUTH_USER_BY_ID, {"user_id": user_id})
+        row = result.one_or_none()
+        user = AuthUser(*row) if row else None
+        if user and generation is not None:
+            _user_cache[user_id] = (user, generation)
+        else:
+            _user_cache.pop(user_id, None)
+    
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+    
+    return user
 
 # Auth endpoints
+# Unexpected errors propagate: get_db rolls the session back and main.py answers 500
 @router.post("/register", response_model=TokenResponse)
 async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
-    try:
-        # Validate password length
-        if len(user_data.password) < settings.PASSWORD_MIN_LENGTH:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Password must be at least {settings.PASSWORD_MIN_LENGTH} characters"
-            )
-        
-        # Check if user already exists
-        result = await db.execute(select(User).where(User.email == user_data.email))
-        if result.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        # Create new user
-        hashed_password = hash_password(user_data.password)
-        user = User(
+    # Create new user; the unique email index rejects duplicates in the same round-trip
+    hashed_password = await hash_password(user_data.password)
+    stmt = (
+        pg_insert(User)
+        .values(
             email=user_data.email,
             password_hash=hashed_password,
             first_name=user_data.first_name,
             last_name=user_data.last_name
         )
-        
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-        
-        # Create JWT token
-        token = create_jwt_token(user)
-        
-        logger.info(f"User registered: {user.email}")
-        
-        return TokenResponse(
-            access_token=token,
-            token_type="bearer",
-            expires_in=settings.jwt_expires_seconds,
-            user=UserResponse(
-                id=user.id,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                is_active=user.is_active,
-                created_at=user.created_at
-            )
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Registration error: {str(e)}")
-        await db.rollback()
-        raise HTTPException(status_code=500, detail="Registration failed")
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    )
+    user = (await db.scalars(stmt)).one_or_none()
+    if user is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    await db.commit()
+    await _mark_email_registered(user.email)
+    
+    # Create JWT token
+    token = create_jwt_token(user)
+    
+    logger.info(f"User registered: {user.email}")
+    
+    return TokenResponse(
+        access_token=token,
+        token_type="bearer",
+        expires_in=settings.jwt_expires_seconds,
+        user=user
+    )
 
 @router.post("/login", response_model=TokenResponse)
 async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user and return JWT token"""
-    try:
-        # Get user by email
-        result = await db.execute(select(User).where(User.email == credentials.email))
-        user = result.scalar_one_or_none()
-        
-        if not user or not user.is_active:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        # Verify password
-        if not verify_password(credentials.password, user.password_hash):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        # Create JWT token
-        token = create_jwt_token(user)
-        
-        logger.info(f"User logged in: {user.email}")
-        
-        return TokenResponse(
-            access_token=token,
-            token_type="bearer",
-            expires_in=settings.jwt_expires_seconds,
-            user=UserResponse(
-                id=user.id,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                is_active=user.is_active,
-                created_at=user.created_at
-            )
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Login error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Login failed")
+    # Get active user by email, unless it recently turned out not to exist
+    user = None
+    if not await _is_unknown_email(credentials.email):
+        result = await db.execute(_LOGIN_BY_EMAIL, {"email": credentials.email})
+        user = result.one_or_none()
+        if not user:
+            await _remember_unknown_email(credentials.email)
+    
+    if not user:
+        await _verify_dummy_password(credentials.password)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Verify password
+    if not await verify_password(credentials.password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Create JWT token
+    token = create_jwt_token(user)
+    
+    logger.info(f"User logged in: {user.email}")
+    
+    return TokenResponse(
+        access_token=token,
+        token_type="bearer",
+        expires_in=settings.jwt_expires_seconds,
+        user=user
+    )
 
 @router.get("/verify")
-async def verify_token(current_user: User = Depends(get_current_user)):
+async def verify_token(current_user: AuthUser = Depends(get_current_user)):
     """Verify JWT token and return user info"""
     return {
         "valid": True,
-        "user": UserResponse(
-            id=current_user.id,
-            email=current_user.email,
-            first_name=current_user.first_name,
-            last_name=current_user.last_name,
-            is_active=current_user.is_active,
-            created_at=current_user.created_at
-        )
+        "user": UserResponse.model_validate(current_user)
     }
 
 @router.get("/profile", response_model=UserResponse)
-async def get_profile(current_user: User = Depends(get_current_user)):
+async def get_profile(current_user: AuthUser = Depends(get_current_user)) -> UserResponse:
     """Get current user profile"""
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        first_name=current_user.first_name,
-        last_name=current_user.last_name,
-        is_active=current_user.is_active,
-        created_at=current_user.created_at
-    )
+    return current_user
 
 @router.put("/profile", response_model=UserResponse)
 async def update_profile(
     profile_data: UserProfile,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
-):
+) -> UserResponse:
     """Update user profile"""
-    try:
-        # Update user fields
-        current_user.first_name = profile_data.first_name
-        current_user.last_name = profile_data.last_name
-        current_user.updated_at = datetime.utcnow()
-        
-        await db.commit()
-        await db.refresh(current_user)
-        
-        logger.info(f"Profile updated: {current_user.email}")
-        
-        return UserResponse(
-            id=current_user.id,
-            email=current_user.email,
-            first_name=current_user.first_name,
-            last_name=current_user.last_name,
-            is_active=current_user.is_active,
-            created_at=current_user.created_at
-        )
-        
-    except Exception as e:
-        logger.error(f"Profile update error: {str(e)}")
-        await db.rollback()
-        raise HTTPException(status_code=500, detail="Profile update failed")
+    # Update user fields and read the row back in the same statement
+    stmt = (
+        update(User)
+        .where(User.id == current_user.id)
+        .values(first_name=profile_data.first_name, last_name=profile_data.last_name)
+        .returning(User)
+    )
+    user = (await db.scalars(stmt)).one()
+    
+    await db.commit()
+    await invalidate_user_cache(user.id)
+    
+    logger.info(f"Profile updated: {user.email}")
+    
+    return user
 
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete user (admin only or self-deletion)"""
-    try:
-        # For now, only allow self-deletion
-        if current_user.id != user_id:
-            raise HTTPException(status_code=403, detail="Can only delete your own account")
-        
-        # Soft delete by setting is_active to False
-        current_user.is_active = False
-        current_user.updated_at = datetime.utcnow()
-        
-        await db.commit()
-        
-        logger.info(f"User deleted: {current_user.email}")
-        
-        return {"message": "User account deactivated successfully"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"User deletion error: {str(e)}")
-        await db.rollback()
-        raise HTTPException(status_code=500, detail="User deletion failed")
\ No newline at end of file
+    # For now, only allow self-deletion
+    if current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Can only delete your own account")
+    
+    # Soft delete by setting is_active to False
+    await db.execute(update(User).where(User.id == user_id).values(is_active=False))
+    await db.commit()
+    await invalidate_user_cache(current_user.id)
+    
+    logger.info(f"User deleted: {current_user.email}")
+    
+    return {"message": "User account deactivated successfully"}
\ No newline at end of file
@@ -11,14 +11,14 @@ async def test_platform_services():
     """Test the unified platform services."""
     base_url = "http://localhost:8007"
     
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(base_url=base_url) as client:
         print("🚀 Testing Platform Services")
         print("=" * 50)
         
         # Test health endpoint
         print("1. Testing health check...")
         try:
-            response = await client.get(f"{base_url}/health")
+            response = await client.get("/health")
             print(f"   Status: {response.status_code}")
             print(f"   Response: {response.json()}")
         except Exception as e:
@@ -29,7 +29,7 @@ async def test_platform_services():
         # Test service info
         print("2. Testing service info...")
         try:
-            response = await client.get(f"{base_url}/")
+            response = await client.get("/")
             print(f"   Status: {response.status_code}")
             data = response.json()
             print(f"   Service: {data.get('service')}")
@@ -50,7 +50,7 @@ async def test_platform_services():
         # Register user
         print("   3a. Registering user...")
         try:
-            response = await client.post(f"{base_url}/auth/register", json=test_user)
+            response = await client.post("/auth/register", json=test_user)
             print(f"   Status: {response.status_code}")
             if response.status_code == 201:
                 token_data = response.json()
@@ -65,7 +65,7 @@ async def test_platform_services():
         # Login user
         print("   3b. Logging in user...")
         try:
-            response = await client.post(f"{base_url}/auth/login", json=test_user)
+            response = await client.post("/auth/login", json=test_user)
             print(f"   Status: {response.status_code}")
             if response.status_code == 200:
                 token_data = response.json()
@@ -82,7 +82,7 @@ async def test_platform_services():
             print("   3c. Verifying token...")
             try:
                 headers = {"Authorization": f"Bearer {token}"}
-                response = await client.get(f"{base_url}/auth/verify", headers=headers)
+                response = await client.get("/auth/verify", headers=headers)
                 print(f"   Status: {response.status_code}")
                 if response.status_code == 200:
                     user_data = response.json()
@@ -118,20 +118,29 @@ async def test_platform_services():
             }
         ]
         
-        for metric in test_metrics:
-            try:
-                response = await client.post(f"{base_url}/analytics/events", json=metric)
+        # Independent requests go out together rather than one round-trip at a time
+        responses = await asyncio.gather(
+            *(client.post("/analytics/events", json=metric) for metric in test_metrics),
+            return_exceptions=True
+        )
+        for metric, response in zip(test_metrics, responses):
+            if isinstance(response, Exception):
+                print(f"   Error recording {metric['type']}: {response}")
+            else:
                 print(f"   Metric {metric['type']}: {response.status_code}")
-            except Exception as e:
-                print(f"   Error recording {metric['type']}: {e}")
         
-        # Wait a bit for async processing
-        await asyncio.sleep(1)
+        metrics_response, stats_response = await asyncio.gather(
+            client.get("/analytics/metrics"),
+            client.get("/analytics/usage/test_user_1"),
+            return_exceptions=True
+        )
         
         # Get system metrics
         print("   4b. Getting system metrics...")
         try:
-            response = await client.get(f"{base_url}/analytics/metrics")
+            if isinstance(metrics_response, Exception):
+                raise metrics_response
+            response = metrics_response
             print(f"   Status: {response.status_code}")
             if response.status_code == 200:
                 metrics = response.json()
@@ -143,7 +152,9 @@ async def test_platform_services():
         # Get user stats
         print("   4c. Getting user statistics...")
         try:
-            response = await client.get(f"{base_url}/analytics/usage/test_user_1")
+            if isinstance(stats_response, Exception):
+                raise stats_response
+            response = stats_response
             print(f"   Status: {response.status_code}")
             if response.status_code == 200:
                 stats = response.json()
@@ -158,19 +169,17 @@ async def test_platform_services():
         # Test legacy endpoints
         print("5. Testing Legacy Endpoints...")
         
-        print("   5a. Legacy metrics...")
-        try:
-            response = await client.get(f"{base_url}/metrics")
-            print(f"   Status: {response.status_code}")
-        except Exception as e:
-            print(f"   Error: {e}")
-        
-        print("   5b. Legacy usage...")
-        try:
-            response = await client.get(f"{base_url}/usage/test_user_1")
-            print(f"   Status: {response.status_code}")
-        except Exception as e:
-            print(f"   Error: {e}")
+        legacy_responses = await asyncio.gather(
+            client.get("/metrics"),
+            client.get("/usage/test_user_1"),
+            return_exceptions=True
+        )
+        for label, response in zip(("5a. Legacy metrics", "5b. Legacy usage"), legacy_responses):
+            print(f"   {label}...")
+            if isinstance(response, Exception):
+                print(f"   Error: {response}")
+            else:
+                print(f"   Status: {response.status_code}")
         
         print()
         print("🎉 Platform Services Test Complete!")
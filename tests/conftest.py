@@ -0,0 +1,63 @@
+"""
+Shared test setup: SQLite databases in a temporary directory and no Redis.
+
+Settings are read at import time, so the environment is set before any
+application module is imported.
+"""
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+_TEST_DIR = tempfile.mkdtemp(prefix="platform-services-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_TEST_DIR}/platform.db"
+os.environ["ANALYTICS_DB_PATH"] = os.path.join(_TEST_DIR, "analytics.db")
+os.environ["REDIS_URL"] = "redis://localhost:1"
+os.environ["DB_POOL_SIZE"] = "2"
+# Cheapest bcrypt cost, to keep hashing out of the test run time
+os.environ["PASSWORD_HASH_ROUNDS"] = "4"
+
+import fakeredis
+import httpx
+import pytest
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import database
+
+@pytest.fixture
+def running_app(monkeypatch):
+    """Factory for a context that runs the app's lifespan against the test databases."""
+    import main
+    
+    # SQLite defaults to NullPool, which rejects the pool size settings
+    create_async_engine = database.create_async_engine
+    monkeypatch.setattr(
+        database, "create_async_engine",
+        lambda url, **kwargs: create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **kwargs)
+    )
+    
+    @asynccontextmanager
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            yield main.app
+    
+    return run
+
+@pytest.fixture
+async def app(running_app):
+    async with running_app() as app:
+        yield app
+
+@pytest.fixture
+async def client(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+async def redis(app, monkeypatch):
+    """In-memory Redis in place of the (unreachable) real one."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await client.flushall()
+    monkeypatch.setattr(database, "redis_client", client)
+    yield client
+    await client.aclose()
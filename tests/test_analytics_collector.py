@@ -0,0 +1,84 @@
+"""
+Tests for the buffered SQLite analytics collector.
+"""
+import sqlite3
+
+import pytest
+
+import analytics_collector
+from analytics_collector import AnalyticsCollector
+from models import Metric, MetricType
+
+@pytest.fixture
+async def collector(tmp_path):
+    collector = AnalyticsCollector(str(tmp_path / "analytics.db"))
+    await collector.init_db()
+    yield collector
+    await collector.close()
+
+def _count_metrics(collector: AnalyticsCollector) -> int:
+    return collector._call_reader(lambda db: db.execute("SELECT COUNT(*) FROM metrics").fetchone()[0])
+
+def _failing_once(collector: AnalyticsCollector, monkeypatch):
+    write_batch = collector._write_batch
+    calls = []
+    
+    def flaky_write_batch(db, *columns):
+        calls.append(len(columns[0]))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return write_batch(db, *columns)
+    
+    monkeypatch.setattr(collector, "_write_batch", flaky_write_batch)
+    return calls
+
+async def test_flush_writes_buffered_metrics(collector):
+    for value in range(5):
+        await collector.record_metric(Metric(type=MetricType.API_CALL, value=value, user_id="u1"))
+    
+    await collector.flush()
+    
+    assert _count_metrics(collector) == 5
+    assert collector._types == []
+
+async def test_failed_batch_is_requeued_not_dropped(collector, monkeypatch):
+    calls = _failing_once(collector, monkeypatch)
+    for value in range(3):
+        await collector.record_metric(Metric(type=MetricType.COST, value=value, user_id="u1"))
+    
+    with pytest.raises(sqlite3.OperationalError):
+        await collector.flush()
+    assert collector._values == [0.0, 1.0, 2.0]
+    
+    await collector.record_metric(Metric(type=MetricType.COST, value=3, user_id="u1"))
+    await collector.flush()
+    
+    assert calls == [3, 4]
+    assert _count_metrics(collector) == 4
+    rows = collector._call_reader(lambda db: db.execute("SELECT value FROM metrics ORDER BY id").fetchall())
+    assert [row[0] for row in rows] == [0.0, 1.0, 2.0, 3.0]
+
+async def test_write_loop_retries_failed_batch(collector, monkeypatch):
+    calls = _failing_once(collector, monkeypatch)
+    await collector.record_metric(Metric(type=MetricType.SESSION, value=1, user_id="u1"))
+    
+    await collector.close()
+    
+    assert len(calls) == 2
+    assert collector._types == []
+
+async def test_close_raises_when_metrics_cannot_be_written(tmp_path, monkeypatch):
+    collector = AnalyticsCollector(str(tmp_path / "analytics.db"))
+    await collector.init_db()
+    monkeypatch.setattr(analytics_collector, "FLUSH_INTERVAL_SECONDS", 0.01)
+    
+    def broken_write_batch(db, *columns):
+        raise sqlite3.OperationalError("disk I/O error")
+    
+    monkeypatch.setattr(collector, "_write_batch", broken_write_batch)
+    await collector.record_metric(Metric(type=MetricType.API_CALL, value=1, user_id="u1"))
+    
+    with pytest.raises(sqlite3.OperationalError):
+        await collector.close()
+    assert collector._writer is None
+    assert len(collector._types) == 1
@@ -0,0 +1,60 @@
+"""
+Tests for the analytics routes.
+"""
+import orjson
+import pytest
+
+import database
+
+async def test_get_metrics_streams_from_its_own_session(client):
+    for value in range(3):
+        response = await client.post("/analytics/metrics", json={
+            "metric_name": "stream_probe", "metric_value": value, "user_id": 7
+        })
+        assert response.status_code == 200
+    
+    response = await client.get("/analytics/metrics", params={"metric_name": "stream_probe", "limit": 2})
+    
+    assert response.status_code == 200
+    body = orjson.loads(response.content)
+    assert body["count"] == 2
+    assert [metric["metric_name"] for metric in body["metrics"]] == ["stream_probe"] * 2
+    # The streaming session is closed once the body is sent
+    assert database.engine.pool.checkedout() == 0
+
+async def test_get_metrics_query_error_is_a_500(client, monkeypatch):
+    async def broken_stream(self, statement, *args, **kwargs):
+        raise RuntimeError("connection lost")
+    
+    monkeypatch.setattr(database.AsyncSession, "stream", broken_stream)
+    
+    response = await client.get("/analytics/metrics")
+    
+    assert response.status_code == 500
+    assert database.engine.pool.checkedout() == 0
+
+async def test_stream_metrics_closes_session_when_rows_fail():
+    from routes.analytics import stream_metrics
+    
+    class FailingResult:
+        async def _rows(self):
+            yield {"id": 1}
+            raise RuntimeError("connection lost")
+        
+        def mappings(self):
+            return self._rows()
+    
+    class Session:
+        closed = False
+        
+        async def close(self):
+            self.closed = True
+    
+    session = Session()
+    chunks = []
+    with pytest.raises(RuntimeError):
+        async for chunk in stream_metrics(session, FailingResult()):
+            chunks.append(chunk)
+    
+    assert chunks == [b'{"metrics":[', b'{"id":1}']
+    assert session.closed
@@ -0,0 +1,92 @@
+"""
+Tests for the auth routes.
+"""
+import dataclasses
+import uuid
+
+import pytest
+
+from routes import auth
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    auth._payload_cache.clear()
+    auth._user_cache.clear()
+
+async def _register(client) -> dict:
+    response = await client.post("/auth/register", json={
+        "email": f"{uuid.uuid4().hex}@example.com", "password": "password123"
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def _bearer(token: dict) -> dict:
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+async def test_verify_rejects_deactivated_user(client):
+    token = await _register(client)
+    assert (await client.get("/auth/verify", headers=_bearer(token))).status_code == 200
+    
+    response = await client.delete(f"/auth/users/{token['user']['id']}", headers=_bearer(token))
+    assert response.status_code == 200
+    
+    response = await client.get("/auth/verify", headers=_bearer(token))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User not found or inactive"
+
+async def test_deactivation_reaches_other_workers_caches(client, redis):
+    token = await _register(client)
+    user_id = token["user"]["id"]
+    assert (await client.get("/auth/verify", headers=_bearer(token))).status_code == 200
+    # What another worker would still hold after this one handles the delete
+    stale_entry = auth._user_cache[user_id]
+    
+    response = await client.delete(f"/auth/users/{user_id}", headers=_bearer(token))
+    assert response.status_code == 200
+    auth._user_cache[user_id] = stale_entry
+    
+    response = await client.get("/auth/verify", headers=_bearer(token))
+    assert response.status_code == 401
+    assert user_id not in auth._user_cache
+
+async def test_cached_user_is_served_while_generation_is_current(client, redis):
+    token = await _register(client)
+    user_id = token["user"]["id"]
+    assert (await client.get("/auth/verify", headers=_bearer(token))).status_code == 200
+    cached_user, generation = auth._user_cache[user_id]
+    auth._user_cache[user_id] = (dataclasses.replace(cached_user, first_name="Cached"), generation)
+    
+    response = await client.get("/auth/profile", headers=_bearer(token))
+    
+    assert response.status_code == 200
+    assert response.json()["first_name"] == "Cached"
+
+async def test_user_cache_is_bypassed_without_redis(client):
+    token = await _register(client)
+    
+    assert (await client.get("/auth/verify", headers=_bearer(token))).status_code == 200
+    assert token["user"]["id"] not in auth._user_cache
+
+async def test_unknown_email_login_is_cached_until_registration(client, redis):
+    email = f"{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "password123"}
+    
+    assert (await client.post("/auth/login", json=credentials)).status_code == 401
+    assert await redis.get(auth._unknown_email_key(email)) == "unknown"
+    
+    assert (await client.post("/auth/register", json=credentials)).status_code == 200
+    assert (await client.post("/auth/login", json=credentials)).status_code == 200
+
+async def test_late_login_miss_cannot_hide_a_new_registration(client, redis):
+    email = f"{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "password123"}
+    assert (await client.post("/auth/register", json=credentials)).status_code == 200
+    
+    # A login that looked the email up just before the registration committed
+    await auth._remember_unknown_email(email)
+    
+    assert await redis.get(auth._unknown_email_key(email)) == "registered"
+    assert (await client.post("/auth/login", json=credentials)).status_code == 200
+
+async def test_startup_hashes_the_timing_dummy_at_the_current_cost(app):
+    assert auth._dummy_password_hash.startswith(f"$2b${auth._hash_rounds:02d}$")
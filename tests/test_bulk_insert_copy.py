@@ -0,0 +1,47 @@
+"""
+Tests for COPY bulk loading; these need a PostgreSQL server.
+
+Set TEST_POSTGRES_URL (postgresql+asyncpg://...) to run them.
+"""
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.sql import text
+
+from database import bulk_insert_copy, supports_copy
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+@pytest.fixture
+async def pg_engine():
+    engine = create_async_engine(TEST_POSTGRES_URL)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE IF NOT EXISTS copy_probe (id integer, name text)"))
+        await conn.execute(text("TRUNCATE copy_probe"))
+    yield engine
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE copy_probe"))
+    await engine.dispose()
+
+async def _count(engine) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT COUNT(*) FROM copy_probe"))).scalar_one()
+
+async def test_copy_as_first_statement_is_rolled_back(pg_engine):
+    async with AsyncSession(pg_engine) as session:
+        assert supports_copy(session)
+        await bulk_insert_copy(session, "copy_probe", [(1, "a"), (2, "b")], ["id", "name"])
+        await session.rollback()
+    
+    assert await _count(pg_engine) == 0
+
+async def test_copy_commits_with_the_session(pg_engine):
+    async with AsyncSession(pg_engine) as session:
+        await bulk_insert_copy(session, "copy_probe", [(1, "a"), (2, "b")], ["id", "name"])
+        await session.execute(text("INSERT INTO copy_probe VALUES (3, 'c')"))
+        await session.commit()
+    
+    assert await _count(pg_engine) == 3
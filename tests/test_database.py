@@ -0,0 +1,59 @@
+"""
+Tests for Redis connection management.
+"""
+import fakeredis
+import pytest
+
+import database
+
+@pytest.fixture
+async def redis_down(monkeypatch):
+    """Redis unreachable at startup, with init_redis calls counted."""
+    attempts = []
+    init_redis = database.init_redis
+    
+    async def counting_init_redis():
+        attempts.append(True)
+        await init_redis()
+    
+    monkeypatch.setattr(database, "init_redis", counting_init_redis)
+    await database.init_redis()
+    assert database.redis_client is None
+    attempts.clear()
+    yield attempts
+    await database.close_redis()
+
+async def test_get_redis_throttles_reconnects(redis_down):
+    assert await database.get_redis() is None
+    assert await database.get_redis() is None
+    assert redis_down == []
+
+async def test_get_redis_reconnects_after_interval(redis_down, monkeypatch):
+    monkeypatch.setattr(database, "redis_retry_at", 0.0)
+    
+    assert await database.get_redis() is None
+    assert len(redis_down) == 1
+    # The failed retry pushes the next attempt out again
+    assert await database.get_redis() is None
+    assert len(redis_down) == 1
+
+async def test_get_redis_returns_client_once_reconnected(redis_down, monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    
+    async def init_redis():
+        redis_down.append(True)
+        database.redis_client = client
+    
+    monkeypatch.setattr(database, "init_redis", init_redis)
+    monkeypatch.setattr(database, "redis_retry_at", 0.0)
+    
+    assert await database.get_redis() is client
+    assert await database.get_redis() is client
+    assert len(redis_down) == 1
+
+async def test_get_redis_does_not_reconnect_after_close(redis_down, monkeypatch):
+    await database.close_redis()
+    monkeypatch.setattr(database, "redis_retry_at", 0.0)
+    
+    assert await database.get_redis() is None
+    assert redis_down == []
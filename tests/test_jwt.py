@@ -0,0 +1,105 @@
+"""
+Tests for the inline HS256 encoder and verifier against PyJWT.
+"""
+import base64
+import time
+from types import SimpleNamespace
+
+import jwt
+import orjson
+import pytest
+
+from config import settings
+from routes.auth import _decode_hs256, _encode_hs256, create_jwt_token
+
+def _claims(**overrides) -> dict:
+    now = int(time.time())
+    return {"sub": "42", "email": "user@example.com", "iat": now, "exp": now + 3600, "type": "access", **overrides}
+
+def _segment(data: dict) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(data)).rstrip(b"=").decode()
+
+def test_encoded_token_decodes_with_pyjwt():
+    claims = _claims()
+    
+    assert jwt.decode(_encode_hs256(claims), settings.JWT_SECRET, algorithms=["HS256"]) == claims
+
+def test_pyjwt_token_decodes_inline():
+    claims = _claims()
+    
+    assert _decode_hs256(jwt.encode(claims, settings.JWT_SECRET, algorithm="HS256")) == claims
+
+def test_ascii_claims_match_pyjwt_byte_for_byte():
+    claims = _claims()
+    
+    assert _encode_hs256(claims) == jwt.encode(claims, settings.JWT_SECRET, algorithm="HS256")
+
+def test_non_ascii_claims_differ_from_pyjwt_but_round_trip():
+    claims = _claims(email="jürgen@exämple.com")
+    ours = _encode_hs256(claims)
+    theirs = jwt.encode(claims, settings.JWT_SECRET, algorithm="HS256")
+    
+    # orjson writes raw UTF-8, PyJWT escapes to \uXXXX
+    assert ours != theirs
+    assert jwt.decode(ours, settings.JWT_SECRET, algorithms=["HS256"]) == claims
+    assert _decode_hs256(theirs) == claims
+
+def test_create_jwt_token_claims():
+    token = create_jwt_token(SimpleNamespace(id=7, email="user@example.com"))
+    
+    claims = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
+    assert claims["sub"] == "7"
+    assert claims["exp"] - claims["iat"] == settings.jwt_expires_seconds
+
+def test_alg_none_is_rejected():
+    token = f"{_segment({'alg': 'none', 'typ': 'JWT'})}.{_segment(_claims())}."
+    
+    with pytest.raises(jwt.DecodeError):
+        _decode_hs256(token)
+
+def test_other_algorithm_is_rejected():
+    token = jwt.encode(_claims(), settings.JWT_SECRET, algorithm="HS512")
+    
+    with pytest.raises(jwt.DecodeError):
+        _decode_hs256(token)
+
+def test_bad_signature_is_rejected():
+    signing_input = _encode_hs256(_claims()).rpartition(".")[0]
+    forged = jwt.encode(_claims(), "another-secret", algorithm="HS256").rpartition(".")[2]
+    
+    with pytest.raises(jwt.InvalidSignatureError):
+        _decode_hs256(f"{signing_input}.{forged}")
+
+def test_tampered_payload_is_rejected():
+    header, _, signature = _encode_hs256(_claims()).split(".")
+    
+    with pytest.raises(jwt.InvalidSignatureError):
+        _decode_hs256(f"{header}.{_segment(_claims(sub='1'))}.{signature}")
+
+def test_expired_token_is_rejected():
+    now = int(time.time())
+    
+    with pytest.raises(jwt.ExpiredSignatureError):
+        _decode_hs256(_encode_hs256(_claims(iat=now - 120, exp=now - 60)))
+
+@pytest.mark.parametrize("claim", ["iat", "nbf"])
+def test_future_token_is_rejected(claim):
+    with pytest.raises(jwt.ImmatureSignatureError):
+        _decode_hs256(_encode_hs256(_claims(**{claim: int(time.time()) + 600})))
+
+def test_non_numeric_time_claim_is_rejected():
+    with pytest.raises(jwt.DecodeError):
+        _decode_hs256(_encode_hs256(_claims(exp="tomorrow")))
+
+@pytest.mark.parametrize("token", [
+    "",
+    "abc",
+    "abc.def",
+    "!!!.###.$$$",
+    f"{_segment({'alg': 'HS256'})}.bm90IGpzb24.sig",
+    f"{base64.urlsafe_b64encode(b'[1]').decode()}.{_segment(_claims())}.sig",
+    f"{_segment({'alg': 'HS256'})}.{base64.urlsafe_b64encode(b'[1]').decode()}.sig",
+])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(jwt.DecodeError):
+        _decode_hs256(token)
@@ -0,0 +1,39 @@
+"""
+Tests for the application lifespan.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from analytics_collector import AnalyticsCollector
+from config import settings
+from models import Metric, MetricType
+
+def _count_metrics(collector: AnalyticsCollector) -> int:
+    return collector._call_reader(lambda db: db.execute("SELECT COUNT(*) FROM metrics").fetchone()[0])
+
+async def test_lifespan_starts_collector_and_purges_expired_metrics(running_app, monkeypatch):
+    # Seed an expired and a current metric with the purge task disabled
+    monkeypatch.setattr(settings, "ANALYTICS_PURGE_INTERVAL", 0)
+    seeder = AnalyticsCollector(settings.ANALYTICS_DB_PATH)
+    await seeder.init_db()
+    expired = datetime.utcnow() - timedelta(days=settings.ANALYTICS_RETENTION_DAYS + 1)
+    await seeder.record_metric(Metric(type=MetricType.API_CALL, value=1, user_id="old", timestamp=expired))
+    await seeder.record_metric(Metric(type=MetricType.API_CALL, value=1, user_id="new"))
+    await seeder.close()
+    
+    monkeypatch.setattr(settings, "ANALYTICS_PURGE_INTERVAL", 3600)
+    async with running_app() as app:
+        collector = app.state.analytics_collector
+        assert collector._writer_task is not None
+        assert collector._purge_task is not None
+        
+        # The purge task runs once at startup
+        for _ in range(100):
+            if _count_metrics(collector) == 1:
+                break
+            await asyncio.sleep(0.01)
+        users = collector._call_reader(lambda db: db.execute("SELECT user_id FROM metrics").fetchall())
+        assert users == [("new",)]
+    
+    assert collector._purge_task is None
+    assert collector._writer is None
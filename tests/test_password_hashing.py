@@ -0,0 +1,53 @@
+"""
+Tests for bcrypt cost calibration.
+"""
+import bcrypt
+
+from config import Settings, settings
+from routes import auth
+
+def test_calibration_never_goes_below_min_rounds():
+    assert auth.calibrate_bcrypt_rounds(target_ms=0, min_rounds=4, max_rounds=6) == 4
+
+def test_min_rounds_defaults_to_configured_rounds():
+    assert Settings.PASSWORD_HASH_MIN_ROUNDS == Settings.PASSWORD_HASH_ROUNDS
+
+async def test_calibrated_cost_is_kept_out_of_settings(monkeypatch):
+    calls = []
+    
+    def calibrate(target_ms, min_rounds):
+        calls.append((target_ms, min_rounds))
+        return min_rounds + 1
+    
+    monkeypatch.setattr(auth, "calibrate_bcrypt_rounds", calibrate)
+    monkeypatch.setattr(auth, "_hash_rounds", settings.PASSWORD_HASH_ROUNDS)
+    monkeypatch.setattr(auth, "_dummy_password_hash", None)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_TARGET_MS", 250)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MIN_ROUNDS", 11)
+    configured = settings.PASSWORD_HASH_ROUNDS
+    
+    await auth.init_password_hashing()
+    
+    assert calls == [(250, 11)]
+    assert settings.PASSWORD_HASH_ROUNDS == configured
+    assert auth._hash_rounds == 12
+    # The timing dummy is hashed at the calibrated cost
+    assert auth._dummy_password_hash.startswith("$2b$12$")
+
+async def test_new_hashes_use_the_calibrated_cost(monkeypatch):
+    monkeypatch.setattr(auth, "_hash_rounds", 4)
+    
+    hashed = await auth.hash_password("password123")
+    
+    assert bcrypt.gensalt(rounds=4)[:7] == hashed.encode()[:7]
+    assert await auth.verify_password("password123", hashed)
+
+async def test_calibration_is_skipped_without_a_target(monkeypatch):
+    monkeypatch.setattr(auth, "_hash_rounds", settings.PASSWORD_HASH_ROUNDS)
+    monkeypatch.setattr(auth, "_dummy_password_hash", None)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_TARGET_MS", 0)
+    
+    await auth.init_password_hashing()
+    
+    assert auth._hash_rounds == settings.PASSWORD_HASH_ROUNDS
+    assert auth._dummy_password_hash.startswith(f"$2b${settings.PASSWORD_HASH_ROUNDS:02d}$")
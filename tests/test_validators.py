@@ -0,0 +1,17 @@
+"""
+Tests for the shared input validators.
+"""
+import pytest
+
+from validators import validate_email
+
+def test_validate_email_lowercases_domain_only():
+    assert validate_email("Jane.Doe@Example.COM") == "Jane.Doe@example.com"
+
+def test_validate_email_passes_none_through():
+    assert validate_email(None) is None
+
+@pytest.mark.parametrize("value", ["", "plain", "a@b", "a b@example.com", "a@@example.com"])
+def test_validate_email_rejects_bad_syntax(value):
+    with pytest.raises(ValueError):
+        validate_email(value)
@@ -0,0 +1,18 @@
+"""
+Input validators shared by the pydantic models and the auth routes.
+Standard library only, so importing them pulls in nothing else.
+"""
+import re
+from typing import Optional
+
+# Precompiled email syntax check, used instead of EmailStr/email-validator
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+def validate_email(value: Optional[str]) -> Optional[str]:
+    """Check email syntax and lowercase the domain, as EmailStr normalizes it."""
+    if value is None:
+        return value
+    if not _EMAIL_RE.fullmatch(value):
+        raise ValueError("value is not a valid email address")
+    local, _, domain = value.rpartition("@")
+    return f"{local}@{domain.lower()}"